@@ -0,0 +1,150 @@
+import asyncio
+import ipaddress
+import random
+import uuid
+from collections import Counter
+from aiohttp import web
+
+# In-process stand-in for the Cloudflare v4 endpoints the bot uses:
+# zones lookup, dns_records list/create/delete and dns_records/batch.
+
+def envelope(result=None, errors=None, result_info=None, status=200):
+    body = {"success": not errors, "errors": errors or [], "messages": [], "result": result}
+    if result_info is not None:
+        body["result_info"] = result_info
+    return web.json_response(body, status=status)
+
+def error(code, message, status=400):
+    return envelope(errors=[{"code": code, "message": message}], status=status)
+
+class FakeCloudflare:
+    def __init__(self, domains, latency=0.0, error_rate=0.0, throttle_rate=0.0, retry_after=1):
+        self.latency = latency  # Seconds added to every response, or a (min, max) range
+        self.error_rate = error_rate  # Fraction of requests answered with a 500
+        self.throttle_rate = throttle_rate  # Fraction of requests answered with a 429
+        self.retry_after = retry_after
+        self.zones = {domain: uuid.uuid4().hex for domain in domains}
+        self.records = {zone_id: {} for zone_id in self.zones.values()}  # zone ID -> record ID -> record
+        self.calls = Counter()  # "METHOD route" -> count
+        self.url = None
+        self._runner = None
+
+    async def start(self, host='127.0.0.1', port=0):
+        app = web.Application(middlewares=[self._inject])
+        app.router.add_get('/client/v4/zones', self.list_zones)
+        app.router.add_get('/client/v4/zones/{zone_id}/dns_records', self.list_records)
+        app.router.add_post('/client/v4/zones/{zone_id}/dns_records', self.create_record)
+        app.router.add_post('/client/v4/zones/{zone_id}/dns_records/batch', self.batch_records)
+        app.router.add_delete('/client/v4/zones/{zone_id}/dns_records/{record_id}', self.delete_record)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}/client/v4"
+        return self.url
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    @web.middleware
+    async def _inject(self, request, handler):
+        route = request.match_info.route.resource.canonical if request.match_info.route.resource else request.path
+        self.calls[f"{request.method} {route}"] += 1
+        latency = self.latency
+        if isinstance(latency, (tuple, list)):
+            latency = random.uniform(*latency)
+        if latency:
+            await asyncio.sleep(latency)
+        if self.throttle_rate and random.random() < self.throttle_rate:
+            response = error(971, "Please wait and consider throttling your request speed", status=429)
+            response.headers["Retry-After"] = str(self.retry_after)
+            return response
+        if self.error_rate and random.random() < self.error_rate:
+            return error(10000, "Internal server error", status=500)
+        return await handler(request)
+
+    def _zone(self, request):
+        zone_id = request.match_info['zone_id']
+        if zone_id not in self.records:
+            raise web.HTTPNotFound(text='{"success": false, "errors": [{"code": 7003, "message": "Could not route"}], '
+                                        '"messages": [], "result": null}', content_type='application/json')
+        return zone_id
+
+    async def list_zones(self, request):
+        name = request.query.get('name')
+        result = [{"id": zone_id, "name": zone_name} for zone_name, zone_id in self.zones.items()
+                  if name is None or zone_name == name]
+        return envelope(result, result_info={"page": 1, "per_page": 50, "count": len(result),
+                                             "total_count": len(result), "total_pages": 1})
+
+    async def list_records(self, request):
+        records = list(self.records[self._zone(request)].values())
+        if 'name' in request.query:
+            records = [record for record in records if record["name"] == request.query['name']]
+        page = int(request.query.get('page', 1))
+        per_page = int(request.query.get('per_page', 100))
+        total_pages = max(1, -(-len(records) // per_page))
+        chunk = records[(page - 1) * per_page:page * per_page]
+        return envelope(chunk, result_info={"page": page, "per_page": per_page, "count": len(chunk),
+                                            "total_count": len(records), "total_pages": total_pages})
+
+    def _validate(self, zone_id, data):
+        record_type = data.get("type")
+        content = data.get("content")
+        if record_type == "A":
+            try:
+                ipaddress.IPv4Address(content)
+            except (ValueError, TypeError):
+                return 1004, "DNS Validation Error: Content for A record must be a valid IPv4 address."
+        if record_type == "AAAA":
+            try:
+                ipaddress.IPv6Address(content)
+            except (ValueError, TypeError):
+                return 1004, "DNS Validation Error: Content for AAAA record must be a valid IPv6 address."
+        if record_type == "SRV":
+            if not all(isinstance(data.get("data", {}).get(key), int) for key in ("priority", "weight", "port")):
+                return 9208, "Failed to parse. priority must be a number."
+        for record in self.records[zone_id].values():
+            if record["name"] == data.get("name") and "CNAME" in (record_type, record["type"]):
+                return 81053, "An A, AAAA, or CNAME record with that host already exists."
+        return None
+
+    def _store(self, zone_id, data):
+        record = {"id": uuid.uuid4().hex, "zone_id": zone_id, "name": data["name"], "type": data["type"],
+                  "content": data.get("content", ""), "proxied": data.get("proxied", False), "ttl": data.get("ttl", 1)}
+        if "data" in data:
+            record["data"] = data["data"]
+        self.records[zone_id][record["id"]] = record
+        return record
+
+    async def create_record(self, request):
+        zone_id = self._zone(request)
+        data = await request.json()
+        problem = self._validate(zone_id, data)
+        if problem:
+            return error(*problem)
+        return envelope(self._store(zone_id, data))
+
+    async def batch_records(self, request):
+        zone_id = self._zone(request)
+        posts = (await request.json()).get("posts", [])
+        # All-or-nothing like the real endpoint
+        for data in posts:
+            problem = self._validate(zone_id, data)
+            if problem:
+                return error(*problem)
+        return envelope({"posts": [self._store(zone_id, data) for data in posts]})
+
+    async def delete_record(self, request):
+        zone_id = self._zone(request)
+        record = self.records[zone_id].pop(request.match_info['record_id'], None)
+        if record is None:
+            return error(81044, "Record does not exist.", status=404)
+        return envelope({"id": record["id"]})
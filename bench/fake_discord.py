@@ -0,0 +1,86 @@
+import itertools
+
+# Minimal stand-ins for the discord.Interaction surface used by the commands and views
+
+_ids = itertools.count(1)
+
+class FakeUser:
+    def __init__(self, user_id, name=None):
+        self.id = user_id
+        self.name = name or f"user{user_id}"
+        self.mention = f"<@{user_id}>"
+        self.sent = []  # DMs
+
+    async def send(self, content=None, **kwargs):
+        self.sent.append((content, kwargs))
+
+class FakeMessage:
+    def __init__(self, content=None, **kwargs):
+        self.id = next(_ids)
+        self.content = content
+        self.kwargs = kwargs
+        self.edits = []
+
+    async def edit(self, **kwargs):
+        self.edits.append(kwargs)
+        return self
+
+class FakeResponse:
+    def __init__(self):
+        self.calls = []  # (method, content, kwargs)
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    def _respond(self, method, content=None, **kwargs):
+        # Discord only accepts one initial response per interaction
+        if self._done:
+            raise RuntimeError("This interaction has already been responded to before")
+        self._done = True
+        self.calls.append((method, content, kwargs))
+
+    async def send_message(self, content=None, **kwargs):
+        self._respond("send_message", content, **kwargs)
+
+    async def edit_message(self, content=None, **kwargs):
+        self._respond("edit_message", content, **kwargs)
+
+    async def defer(self, **kwargs):
+        self._respond("defer", **kwargs)
+
+    async def send_modal(self, modal):
+        self._respond("send_modal", modal=modal)
+
+class FakeFollowup:
+    def __init__(self, response):
+        self.response = response
+        self.messages = []
+
+    async def send(self, content=None, **kwargs):
+        # Follow-ups are only accepted once the interaction has been responded to
+        if not self.response.is_done():
+            raise RuntimeError("Follow-up sent before the initial response")
+        message = FakeMessage(content, **kwargs)
+        self.messages.append(message)
+        return message
+
+class FakeInteraction:
+    def __init__(self, user, client=None, data=None):
+        self.id = next(_ids)
+        self.user = user
+        self.client = client
+        self.data = data or {}
+        self.application_id = 0
+        self.token = f"fake-token-{self.id}"
+        self.response = FakeResponse()
+        self.followup = FakeFollowup(self.response)
+
+    @property
+    def responses(self):
+        # Initial response followed by any follow-ups and their edits, for assertions in benchmarks
+        calls = list(self.response.calls)
+        for message in self.followup.messages:
+            calls.append(("followup", message.content, message.kwargs))
+            calls.extend(("edit", None, kwargs) for kwargs in message.edits)
+        return calls
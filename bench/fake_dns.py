@@ -0,0 +1,49 @@
+import asyncio
+import socket
+import struct
+from resolver import QTYPES, TYPE_NAMES, NOERROR, NXDOMAIN, encode_name, read_name
+
+# Stub DNS server answering over UDP from the fake Cloudflare API's records, so propagation
+# checks and health scans can run without the network. Proxied records answer with their content.
+
+class FakeDns(asyncio.DatagramProtocol):
+    def __init__(self, cloudflare, latency=0.0):
+        self.cloudflare = cloudflare
+        self.latency = latency  # Seconds before each answer is sent
+        self.queries = 0
+        self.transport = None
+
+    async def start(self, host='127.0.0.1', port=0):
+        self.transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(lambda: self, local_addr=(host, port))
+        return self.transport.get_extra_info('sockname')[:2]
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+    def datagram_received(self, data, addr):
+        self.queries += 1
+        query_id, _, _, _, _, _ = struct.unpack_from("!HHHHHH", data)
+        name, offset = read_name(data, 12)
+        qtype, _ = struct.unpack_from("!HH", data, offset)
+        records = [record for zone in self.cloudflare.records.values() for record in zone.values()
+                   if record["name"].lower() == name.lower()]
+        answers = [self._answer(record) for record in records
+                   if record["type"] == TYPE_NAMES.get(qtype) or record["type"] == "CNAME"]
+        rcode = NOERROR if records else NXDOMAIN
+        packet = (struct.pack("!HHHHHH", query_id, 0x8180 | rcode, 1, len(answers), 0, 0)
+                  + data[12:offset + 4] + b"".join(answers))
+        asyncio.get_running_loop().call_later(self.latency, self.transport.sendto, packet, addr)
+
+    def _answer(self, record):
+        if record["type"] == "A":
+            rdata = socket.inet_pton(socket.AF_INET, record["content"])
+        elif record["type"] == "AAAA":
+            rdata = socket.inet_pton(socket.AF_INET6, record["content"])
+        elif record["type"] == "CNAME":
+            rdata = encode_name(record["content"])
+        else:
+            raw = record["content"].encode('utf-8')
+            rdata = b"".join(bytes([len(raw[i:i + 255])]) + raw[i:i + 255] for i in range(0, len(raw), 255)) or b"\0"
+        # Name is a pointer back to the question
+        return struct.pack("!HHHIH", 0xC00C, QTYPES[record["type"]], 1, 300, len(rdata)) + rdata
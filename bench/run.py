@@ -0,0 +1,180 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+# End-to-end benchmark of the bot's command handlers against the fake Cloudflare API.
+# Usage: python -m bench.run [--ops 2000] [--concurrency 200] [--latency 0.02] [--json results.json]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADMIN_ID = 1
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark bot commands against a local fake Cloudflare API")
+    parser.add_argument('--ops', type=int, default=2000, help="Operations per phase")
+    parser.add_argument('--users', type=int, default=200, help="Distinct users the operations are spread over")
+    parser.add_argument('--concurrency', type=int, default=200, help="Operations in flight at once")
+    parser.add_argument('--latency', type=float, default=0.02, help="Fake API latency in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of API calls answered with a 500")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Fraction of API calls answered with a 429")
+    parser.add_argument('--real-budget', action='store_true', help="Keep the configured Cloudflare rate budget")
+    parser.add_argument('--json', help="Write the results to this file for comparison between commits")
+    return parser.parse_args()
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))] if ordered else 0.0
+
+def succeeded(interaction, good_titles):
+    for _, _, kwargs in interaction.responses:
+        embed = kwargs.get("embed")
+        if embed is not None and embed.title in good_titles:
+            return True
+    return False
+
+async def run_phase(name, count, concurrency, fake, operation):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = 0
+
+    async def run_one(index):
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                ok = await operation(index)
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            if not ok:
+                failures += 1
+
+    calls_before = fake.total_calls
+    started = time.perf_counter()
+    await asyncio.gather(*(run_one(index) for index in range(count)))
+    elapsed = time.perf_counter() - started
+    return {
+        "phase": name,
+        "ops": count,
+        "failures": failures,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "ops_per_sec": round(count / elapsed, 1) if elapsed else 0.0,
+        "api_calls_per_op": round((fake.total_calls - calls_before) / count, 2) if count else 0.0
+    }
+
+async def main(args):
+    # Import the bot only after moving into a scratch directory so data.json and logs stay untouched
+    import bot as bot_module
+    import cloudflare
+    from bench.fake_cloudflare import FakeCloudflare
+    from bench.fake_discord import FakeInteraction, FakeUser
+    from bench.fake_dns import FakeDns
+    from config import DOMAINS
+    from health import health, propagation
+    from jobs import jobs
+    from journal import journal
+    from ratelimit import RateLimiter, TokenBucket
+    from resolver import resolver
+    from storage import store
+    from views.subdomain_creation import SubdomainCreationView
+
+    fake = FakeCloudflare(DOMAINS, latency=args.latency, error_rate=args.error_rate, throttle_rate=args.throttle_rate)
+    base_url = await fake.start()
+    for client in cloudflare.clients:
+        client.base_url = base_url
+        if not args.real_budget:
+            client.limiter = RateLimiter(TokenBucket(10 ** 9, 1, 10 ** 9))
+    await cloudflare.clients.start()
+    journal.start()
+    fake_dns = FakeDns(fake, latency=args.latency)
+    resolver.host, resolver.port = await fake_dns.start()
+    await resolver.start()
+    await cloudflare.zones.prefetch()
+    await jobs.start(bot_module.bot)
+    await cloudflare.mirror.refresh(force=True)
+    store.add_admin(ADMIN_ID)
+
+    domain = DOMAINS[0]
+    users = [FakeUser(1000 + index) for index in range(args.users)]
+    admin = FakeUser(ADMIN_ID)
+
+    async def create(index):
+        interaction = FakeInteraction(users[index % len(users)], client=bot_module.bot)
+        view = SubdomainCreationView()
+        view.domain = domain
+        view.record_type = "A"
+        view.subdomain = f"bench{index}.{domain}"
+        view.record_content = f"192.0.2.{index % 250 + 1}"
+        view.proxy_status = False
+        await view.finalize_subdomain(interaction)
+        view.stop()
+        # Time the whole operation, not just the acknowledgement
+        await jobs.wait_for(f"create:{view.subdomain}")
+        return succeeded(interaction, {"Subdomain Created"})
+
+    async def list_own(index):
+        interaction = FakeInteraction(users[index % len(users)], client=bot_module.bot)
+        await bot_module.list_subdomains.callback(interaction)
+        return succeeded(interaction, {"Your Subdomains"})
+
+    async def scan(index):
+        report = await health.scan()
+        return report["checked"] > 0 and not report["errors"]
+
+    async def remove(index):
+        user = users[index % len(users)]
+        owned = store.get_subdomains(user.id)
+        if not owned:
+            return False
+        interaction = FakeInteraction(user, client=bot_module.bot)
+        await bot_module.remove_subdomain.callback(interaction, owned[0])
+        await jobs.wait_for(f"delete:{owned[0]}")
+        return succeeded(interaction, {"Subdomain Deleted"})
+
+    async def ban(index):
+        interaction = FakeInteraction(admin, client=bot_module.bot)
+        await bot_module.ban_user.callback(interaction, users[index])
+        await jobs.wait_for(f"ban:{users[index].id}")
+        return succeeded(interaction, {"User Banned"})
+
+    results = [
+        await run_phase("create", args.ops, args.concurrency, fake, create),
+        await run_phase("list", args.ops, args.concurrency, fake, list_own),
+        await run_phase("scan", 1, 1, fake, scan),
+        await run_phase("remove", args.ops // 2, args.concurrency, fake, remove),
+        await run_phase("ban", len(users), args.concurrency, fake, ban)
+    ]
+
+    await jobs.close()
+    propagation.stop()
+    resolver.close()
+    fake_dns.close()
+    await cloudflare.clients.close()
+    await store.close()
+    await journal.close()
+    await fake.close()
+    return results
+
+def report(results):
+    header = f"{'phase':<8} {'ops':>6} {'fail':>5} {'p50 ms':>9} {'p99 ms':>9} {'ops/s':>9} {'calls/op':>9}"
+    print(header)
+    print('-' * len(header))
+    for result in results:
+        print(f"{result['phase']:<8} {result['ops']:>6} {result['failures']:>5} {result['p50_ms']:>9} "
+              f"{result['p99_ms']:>9} {result['ops_per_sec']:>9} {result['api_calls_per_op']:>9}")
+
+if __name__ == "__main__":
+    args = parse_args()
+    output = os.path.abspath(args.json) if args.json else None
+    sys.path.insert(0, ROOT)
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        results = asyncio.run(main(args))
+    report(results)
+    if output:
+        with open(output, 'w') as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=4)
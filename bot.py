@@ -1,158 +1,489 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
+import argparse
+import asyncio
+import csv
+import hashlib
 import json
 import os
+import subprocess
+import sys
+import tempfile
 from dotenv import load_dotenv
 from views.subdomain_creation import SubdomainCreationView
 from cloudflare import get_user_subdomains, delete_subdomain
-from commands import ban, load_data
+import cloudflare
+from ratelimit import BULK
+from commands import ban
+from storage import store
+from config import DOMAINS, BULK_MAX_ROWS, STORAGE_BACKEND, AUTOCOMPLETE_REBUILD_INTERVAL
+from prefix_index import subdomain_index
+import bulk
+import metrics
+from config import METRICS_HOST, METRICS_PORT, COMMAND_HASH_FILE
+from journal import journal
+from jobs import jobs
+from resolver import resolver
+from health import health, propagation
+from config import JOB_DELETE_CONCURRENCY
 
 # Load environment variables
 load_dotenv()
 
 # Bot setup
+def command_tree_hash(tree):
+    # Stable hash of everything Discord stores about our commands
+    payload = sorted((command.to_dict(tree) for command in tree.get_commands()),
+                     key=lambda command: (command.get("type", 1), command["name"]))
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+class DomainForgeBot(commands.AutoShardedBot):
+    metrics_runner = None
+    metrics_port = METRICS_PORT
+    sync_enabled = True  # Only one worker process syncs the command tree
+    scan_enabled = True  # and runs the scheduled health scan
+    force_sync = False
+
+    async def setup_hook(self):
+        # Runs once per process, unlike on_ready which fires again on every reconnect
+        journal.start()
+        subdomain_index.rebuild(store)
+        if STORAGE_BACKEND == "sqlite":
+            subdomain_index.start(store, AUTOCOMPLETE_REBUILD_INTERVAL)
+        # Open each profile's Cloudflare connection pool once, before any command can run
+        await cloudflare.clients.start()
+        await asyncio.gather(cloudflare.zones.prefetch(), self.sync_commands())
+        await resolver.start()
+        # Resume jobs left over from the last run
+        await jobs.start(self)
+        cloudflare.zones.start()
+        cloudflare.mirror.start()
+        if self.scan_enabled:
+            health.start()
+        if self.metrics_port is not None:
+            try:
+                self.metrics_runner = await metrics.start_server(METRICS_HOST, self.metrics_port)
+            except OSError as e:
+                # Metrics are optional, never let a taken port stop the bot
+                print(f"Failed to start metrics server on {METRICS_HOST}:{self.metrics_port}: {e}")
+                self.metrics_runner = None
+
+    async def sync_commands(self):
+        if not self.sync_enabled:
+            return
+        digest = f"{self.application_id}:{command_tree_hash(self.tree)}"
+        if not self.force_sync and os.path.exists(COMMAND_HASH_FILE):
+            with open(COMMAND_HASH_FILE, 'r') as f:
+                if f.read().strip() == digest:
+                    print("Command tree unchanged, skipping sync")
+                    return
+        try:
+            synced = await self.tree.sync()
+            print(f"Synced {len(synced)} command(s)")
+            with open(COMMAND_HASH_FILE, 'w') as f:
+                f.write(digest)
+        except Exception as e:
+            print(f"Failed to sync commands: {e}")
+
+    async def close(self):
+        await super().close()
+        cloudflare.zones.stop()
+        cloudflare.mirror.stop()
+        subdomain_index.stop()
+        await jobs.close()
+        health.stop()
+        propagation.stop()
+        resolver.close()
+        await cloudflare.clients.close()
+        await store.close()
+        if self.metrics_runner is not None:
+            await self.metrics_runner.cleanup()
+        await journal.close()
+
+# Keep the autocomplete index in step with every registry change
+store.add_listener(subdomain_index.on_change)
+
 intents = discord.Intents.default()
-bot = commands.Bot(command_prefix='!', intents=intents)
-
-# Load data from JSON
-def load_data():
-    if os.path.exists('data.json'):
-        with open('data.json', 'r') as f:
-            return json.load(f)
-    return {"admins": [], "users": {}, "banned_users": []}
-
-# Save data to JSON
-def save_data(data):
-    with open('data.json', 'w') as f:
-        json.dump(data, f, indent=4)
+bot = DomainForgeBot(command_prefix='!', intents=intents)
+
 # Check if user is an admin
 def is_admin(user_id):
-    data = load_data()
-    print(f"Checking admin status for user_id: {user_id}")
-    print(f"Admins in data: {data['admins']}")
-    return str(user_id) in [str(admin_id) for admin_id in data['admins']]
+    return store.is_admin(user_id)
 # Check if user is banned
 def is_banned(user_id):
-    data = load_data()
-    return str(user_id) in data.get('banned_users', [])
+    return store.is_banned(user_id)
 
 @bot.event
 async def on_ready():
     print(f'Logged in as {bot.user} (ID: {bot.user.id})')
-    try:
-        synced = await bot.tree.sync()
-        print(f"Synced {len(synced)} command(s)")
-    except Exception as e:
-        print(f"Failed to sync commands: {e}")
 # Create a subdomain
 @bot.tree.command(name="create-subdomain", description="Create a new subdomain")
+@metrics.instrument_command
 async def create_subdomain(interaction: discord.Interaction):
     if is_banned(interaction.user.id):
         await interaction.response.send_message("You are banned from using this bot.", ephemeral=True)
         return
     view = SubdomainCreationView()
     embed = discord.Embed(title="Subdomain Creation", description="*Let's create a subdomain!*", color=discord.Color.green())
+    # The view handles the remaining steps itself, so the command returns once the wizard is shown
     await interaction.response.send_message(embed=embed, view=view)
-    await view.wait()
 # Delete a subdomain
 @bot.tree.command(name="list", description="Show subdomains under the user")
+@metrics.instrument_command
 async def list_subdomains(interaction: discord.Interaction):
     if is_banned(interaction.user.id):
         await interaction.response.send_message("You are banned from using this bot.", ephemeral=True)
         return
-    user_id = str(interaction.user.id)
-    data = load_data()
-    if user_id in data['users']:
-        subdomains = data['users'][user_id]
-        embed = discord.Embed(title="Your Subdomains", description=f"{', '.join(subdomains)}", color=discord.Color.blue())
+    subdomains = await get_user_subdomains(interaction.user.id)
+    if subdomains:
+        lines = []
+        for subdomain, records in subdomains.items():
+            if records:
+                contents = ', '.join(f"{record['type']} {record['content']}" for record in records)
+                lines.append(f"{subdomain} ({contents})")
+            elif cloudflare.mirror.is_synced(cloudflare.zones.zone_for(subdomain)):
+                lines.append(f"{subdomain} (missing from Cloudflare)")
+            else:
+                lines.append(subdomain)
+        embed = discord.Embed(title="Your Subdomains", description="\n".join(lines)[:4096], color=discord.Color.blue())
     else:
         embed = discord.Embed(title="No Subdomains", description="You don't have any subdomains.", color=discord.Color.red())
     await interaction.response.send_message(embed=embed)
 # Delete a subdomain
 @bot.tree.command(name="userinfo", description="Show user info (Bot admin only)")
+@metrics.instrument_command
 async def userinfo(interaction: discord.Interaction, user: discord.User):
-    print(f"User ID attempting admin command: {interaction.user.id}")
     if not is_admin(interaction.user.id):
         embed = discord.Embed(title="Permission Denied", description="You don't have permission to use this command.", color=discord.Color.red())
         await interaction.response.send_message(embed=embed, ephemeral=True)
         return
 
-    data = load_data()
-    user_id = str(user.id)
-    if user_id in data['users']:
-        subdomains = data['users'][user_id]
+    subdomains = store.get_subdomains(user.id)
+    if subdomains:
         embed = discord.Embed(title=f"User Info: {user.name}", description=f"Total domains: {len(subdomains)}\nDomains: {', '.join(subdomains)}", color=discord.Color.blue())
     else:
         embed = discord.Embed(title=f"User Info: {user.name}", description="No subdomains registered.", color=discord.Color.red())
     await interaction.response.send_message(embed=embed)
 @bot.tree.command(name="ban", description="Ban user and delete all their subdomains (Bot admin only)")
+@metrics.instrument_command
 async def ban_user(interaction: discord.Interaction, user: discord.User):
     if not is_admin(interaction.user.id):
         embed = discord.Embed(title="Permission Denied", description="You don't have permission to use this command.", color=discord.Color.red())
         await interaction.response.send_message(embed=embed, ephemeral=True)
         return
-    data = load_data()
-    user_id = str(user.id)
-    if user_id in data['users']:
-        subdomains = data['users'][user_id]
-        for subdomain in subdomains:
-            await delete_subdomain(subdomain)
-        del data['users'][user_id]
-        data['banned_users'].append(user_id)
-        save_data(data)
-        embed = discord.Embed(title="User Banned", description=f"User {user.name} has been banned and all their subdomains have been deleted.", color=discord.Color.green())
-    else:
+    subdomains = store.get_subdomains(user.id)
+    if not subdomains:
         embed = discord.Embed(title="No Subdomains", description=f"User {user.name} has no subdomains to delete.", color=discord.Color.red())
-    await interaction.response.send_message(embed=embed)
+        await interaction.response.send_message(embed=embed)
+        return
+    # Ban straight away so nothing new is created while the deletions run in the background
+    store.ban(user.id)
+    await interaction.response.defer(thinking=True)
+    _, queued = jobs.submit("ban", f"ban:{user.id}", {"user_id": user.id, "name": user.name}, interaction)
+    if not queued:
+        embed = discord.Embed(title="Already In Progress", description=f"User {user.name} is already being banned.", color=discord.Color.yellow())
+        await interaction.followup.send(embed=embed)
+
+@jobs.handler("ban")
+async def run_ban(job):
+    user_id, name = job.args["user_id"], job.args["name"]
+    store.ban(user_id)
+    subdomains = store.get_subdomains(user_id)
+    embed = discord.Embed(title="Banning User", description=f"Deleting {len(subdomains)} subdomain(s) of {name}...", color=discord.Color.blue())
+    await job.notify(embed=embed)
+    semaphore = asyncio.Semaphore(JOB_DELETE_CONCURRENCY)
+    failed = []
+    done = 0
+
+    async def delete(subdomain):
+        nonlocal done
+        async with semaphore:
+            if await delete_subdomain(subdomain, store.get_record(subdomain), priority=BULK):
+                store.remove_subdomain(user_id, subdomain)
+            else:
+                failed.append(subdomain)
+        done += 1
+        if done % 10 == 0 and done < len(subdomains):
+            embed.description = f"Deleted {done}/{len(subdomains)} subdomain(s) of {name}..."
+            await job.notify(embed=embed)
+
+    await asyncio.gather(*(delete(subdomain) for subdomain in subdomains))
+    if failed:
+        # Keep the ones Cloudflare refused so they stay owned and can be removed again later
+        description = (f"User {name} has been banned. {len(subdomains) - len(failed)} subdomain(s) were deleted, "
+                       f"these could not be deleted and are still registered: {', '.join(failed)}")[:4096]
+        embed = discord.Embed(title="User Banned", description=description, color=discord.Color.yellow())
+    else:
+        embed = discord.Embed(title="User Banned", description=f"User {name} has been banned and all their subdomains have been deleted.", color=discord.Color.green())
+    await job.notify(embed=embed)
+    return not failed
 
 @bot.tree.command(name="whois", description="Look up the subdomain registered by the user (Bot admin only)")
+@metrics.instrument_command
 async def whois(interaction: discord.Interaction, domain: str):
     if not is_admin(interaction.user.id):
         embed = discord.Embed(title="Permission Denied", description="You don't have permission to use this command.", color=discord.Color.red())
         await interaction.response.send_message(embed=embed, ephemeral=True)
         return
 
-    data = load_data()
-    for user_id, subdomains in data['users'].items():
-        if domain in subdomains:
-            user = await bot.fetch_user(int(user_id))
-            embed = discord.Embed(title="Whois Lookup", description=f"Domain {domain} is registered by user {user.name} (ID: {user_id})", color=discord.Color.blue())
-            await interaction.response.send_message(embed=embed)
-            return
+    user_id = store.owner_of(domain)
+    if user_id is not None:
+        user = await bot.fetch_user(int(user_id))
+        embed = discord.Embed(title="Whois Lookup", description=f"Domain {domain} is registered by user {user.name} (ID: {user_id})", color=discord.Color.blue())
+        await interaction.response.send_message(embed=embed)
+        return
     embed = discord.Embed(title="Whois Lookup", description=f"Domain {domain} is not registered by any user.", color=discord.Color.red())
     await interaction.response.send_message(embed=embed)
 
+@whois.autocomplete('domain')
+async def whois_autocomplete(interaction: discord.Interaction, current: str):
+    if not is_admin(interaction.user.id):
+        return []
+    return [app_commands.Choice(name=name[:100], value=name) for name in subdomain_index.search_all(current)]
+
 @bot.tree.command(name="unban", description="Unban a user (Bot admin only)")
+@metrics.instrument_command
 async def unban_user(interaction: discord.Interaction, user: discord.User):
     if not is_admin(interaction.user.id):
         embed = discord.Embed(title="Permission Denied", description="You don't have permission to use this command.", color=discord.Color.red())
         await interaction.response.send_message(embed=embed, ephemeral=True)
         return
 
-    data = load_data()
-    user_id = str(user.id)
-    if user_id in data.get('banned_users', []):
-        data['banned_users'].remove(user_id)
-        save_data(data)
+    if store.unban(user.id):
         embed = discord.Embed(title="User Unbanned", description=f"User {user.name} has been unbanned and can now use the bot again.", color=discord.Color.green())
     else:
         embed = discord.Embed(title="Not Banned", description=f"User {user.name} is not currently banned.", color=discord.Color.yellow())
     await interaction.response.send_message(embed=embed)
 
 @bot.tree.command(name="remove", description="Delete user's subdomain")
+@metrics.instrument_command
 async def remove_subdomain(interaction: discord.Interaction, domain: str):
     user_id = str(interaction.user.id)
-    data = load_data()
-    if user_id in data['users'] and domain in data['users'][user_id]:
-        if await delete_subdomain(domain):
-            data['users'][user_id].remove(domain)
-            save_data(data)
-            embed = discord.Embed(title="Subdomain Deleted", description=f"Subdomain {domain} has been deleted.", color=discord.Color.green())
-        else:
-            embed = discord.Embed(title="Deletion Failed", description=f"Failed to delete subdomain {domain}.", color=discord.Color.red())
-    else:
+    if store.owner_of(domain) != user_id:
         embed = discord.Embed(title="Ownership Issue", description=f"You don't own the subdomain {domain}.", color=discord.Color.red())
-    await interaction.response.send_message(embed=embed)
+        await interaction.response.send_message(embed=embed)
+        return
+    await interaction.response.defer(thinking=True)
+    _, queued = jobs.submit("delete", f"delete:{domain}", {"user_id": user_id, "domain": domain}, interaction)
+    if not queued:
+        embed = discord.Embed(title="Already In Progress", description=f"Subdomain {domain} is already being deleted.", color=discord.Color.yellow())
+        await interaction.followup.send(embed=embed)
+
+@jobs.handler("delete")
+async def run_delete(job):
+    user_id, domain = job.args["user_id"], job.args["domain"]
+    success = await delete_subdomain(domain, store.get_record(domain))
+    if success:
+        store.remove_subdomain(user_id, domain)
+        embed = discord.Embed(title="Subdomain Deleted", description=f"Subdomain {domain} has been deleted.", color=discord.Color.green())
+    else:
+        embed = discord.Embed(title="Deletion Failed", description=f"Failed to delete subdomain {domain}.", color=discord.Color.red())
+    await job.notify(embed=embed)
+    return success
+
+@remove_subdomain.autocomplete('domain')
+async def remove_autocomplete(interaction: discord.Interaction, current: str):
+    return [app_commands.Choice(name=name[:100], value=name) for name in subdomain_index.search_user(interaction.user.id, current)]
+
+@bot.tree.command(name="reconcile", description="Compare registered subdomains with Cloudflare (Bot admin only)")
+@metrics.instrument_command
+async def reconcile(interaction: discord.Interaction):
+    if not is_admin(interaction.user.id):
+        embed = discord.Embed(title="Permission Denied", description="You don't have permission to use this command.", color=discord.Color.red())
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+        return
+
+    report = cloudflare.mirror.reconcile(store.all_subdomains())
+    embed = discord.Embed(title="Reconcile Report", color=discord.Color.blue())
+    for title, key in (("Orphaned records (in Cloudflare, not registered)", "orphaned"),
+                       ("Missing records (registered, not in Cloudflare)", "missing"),
+                       ("Duplicate records", "duplicates")):
+        names = report[key]
+        value = ", ".join(names[:20]) + (f" and {len(names) - 20} more" if len(names) > 20 else "") if names else "None"
+        embed.add_field(name=f"{title}: {len(names)}", value=value[:1024], inline=False)
+    synced = len(cloudflare.mirror.synced)
+    embed.set_footer(text=f"Mirror covers {synced}/{len(cloudflare.zones.domains)} zones")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@bot.tree.command(name="health", description="DNS health report of all registered subdomains (Bot admin only)")
+@metrics.instrument_command
+async def health_report(interaction: discord.Interaction, rescan: bool = False):
+    if not is_admin(interaction.user.id):
+        embed = discord.Embed(title="Permission Denied", description="You don't have permission to use this command.", color=discord.Color.red())
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+        return
+
+    await interaction.response.defer(ephemeral=True)
+    report = health.report
+    if report is None or rescan:
+        report = await health.scan()
+    embed = discord.Embed(title="Health Report", description=f"Scanned {report['checked']} subdomains <t:{int(report['finished'])}:R> in {report['duration']:.1f}s", color=discord.Color.blue())
+    for title, key in (("Dangling CNAMEs (target does not resolve)", "dangling"),
+                       ("Not resolving", "unresolved"),
+                       ("Unroutable targets", "unroutable"),
+                       ("Lookup errors", "errors")):
+        names = report[key]
+        value = ", ".join(names[:20]) + (f" and {len(names) - 20} more" if len(names) > 20 else "") if names else "None"
+        embed.add_field(name=f"{title}: {len(names)}", value=value[:1024], inline=False)
+    embed.set_footer(text=f"Resolver {resolver.host}:{resolver.port}")
+    await interaction.followup.send(embed=embed, ephemeral=True)
+
+@bot.tree.command(name="import", description="Create many records from a CSV or JSONL file (Bot admin only)")
+@metrics.instrument_command
+async def import_records(interaction: discord.Interaction, file: discord.Attachment):
+    if not is_admin(interaction.user.id):
+        embed = discord.Embed(title="Permission Denied", description="You don't have permission to use this command.", color=discord.Color.red())
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+        return
+
+    await interaction.response.defer(ephemeral=True)
+    try:
+        rows = bulk.parse_rows(file.filename, await file.read())
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        embed = discord.Embed(title="Import Failed", description=f"Could not read {file.filename}: {str(e)}", color=discord.Color.red())
+        await interaction.followup.send(embed=embed, ephemeral=True)
+        return
+    if len(rows) > BULK_MAX_ROWS:
+        embed = discord.Embed(title="Import Failed", description=f"{file.filename} has {len(rows)} rows, the limit is {BULK_MAX_ROWS}.", color=discord.Color.red())
+        await interaction.followup.send(embed=embed, ephemeral=True)
+        return
+
+    embed = discord.Embed(title="Importing Records", description=f"Validating {len(rows)} rows...", color=discord.Color.blue())
+    message = await interaction.followup.send(embed=embed, ephemeral=True, wait=True)
+
+    async def progress(done, total):
+        embed.description = f"Submitted {done}/{total} valid rows"
+        await message.edit(embed=embed)
+
+    results = await bulk.import_rows(rows, interaction.user.id, progress)
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    embed = discord.Embed(title="Import Finished", color=discord.Color.green() if counts.get("created") else discord.Color.red())
+    for status in ("created", "failed", "invalid"):
+        embed.add_field(name=status.capitalize(), value=str(counts.get(status, 0)), inline=True)
+    with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as fp:
+        for chunk in bulk.iter_csv(bulk.RESULT_COLUMNS, results):
+            fp.write(chunk.encode('utf-8'))
+        fp.seek(0)
+        await message.edit(embed=embed, attachments=[discord.File(fp, filename="import_results.csv")])
+
+@bot.tree.command(name="export", description="Export a user's or a zone's records as CSV (Bot admin only)")
+@app_commands.choices(zone=[app_commands.Choice(name=domain, value=domain) for domain in DOMAINS])
+@metrics.instrument_command
+async def export_records(interaction: discord.Interaction, user: discord.User = None, zone: str = None):
+    if not is_admin(interaction.user.id):
+        embed = discord.Embed(title="Permission Denied", description="You don't have permission to use this command.", color=discord.Color.red())
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+        return
+    if (user is None) == (zone is None):
+        embed = discord.Embed(title="Export", description="Choose either a user or a zone to export.", color=discord.Color.red())
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+        return
+
+    await interaction.response.defer(ephemeral=True)
+    if user is not None:
+        rows, filename = bulk.iter_user_records(user.id), f"records_{user.id}.csv"
+    else:
+        rows, filename = bulk.iter_zone_records(zone), f"records_{zone}.csv"
+    with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as fp:
+        for chunk in bulk.iter_csv(bulk.EXPORT_COLUMNS, rows):
+            fp.write(chunk.encode('utf-8'))
+        fp.seek(0)
+        await interaction.followup.send(file=discord.File(fp, filename=filename), ephemeral=True)
+
+@bot.tree.command(name="stats", description="Show command and Cloudflare latency statistics (Bot admin only)")
+@metrics.instrument_command
+async def stats(interaction: discord.Interaction):
+    if not is_admin(interaction.user.id):
+        embed = discord.Embed(title="Permission Denied", description="You don't have permission to use this command.", color=discord.Color.red())
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+        return
+
+    def describe(histogram, **labels):
+        p50, p99 = histogram.quantile(0.5, **labels), histogram.quantile(0.99, **labels)
+        return f"{histogram.count(**labels)} calls, p50 {p50 * 1000:.0f}ms, p99 {p99 * 1000:.0f}ms"
+
+    embed = discord.Embed(title="Bot Statistics", color=discord.Color.blue())
+    command_lines = [f"`{key[0]}`: {describe(metrics.command_seconds, command=key[0])}"
+                     for key in sorted(metrics.command_seconds.values)]
+    embed.add_field(name="Commands", value="\n".join(command_lines)[:1024] or "None yet", inline=False)
+    endpoint_lines = [f"`{method} {endpoint}`: {describe(metrics.cloudflare_seconds, method=method, endpoint=endpoint)}"
+                      for method, endpoint in sorted(metrics.cloudflare_seconds.values)]
+    embed.add_field(name="Cloudflare", value="\n".join(endpoint_lines)[:1024] or "None yet", inline=False)
+    errors = ", ".join(f"{key[0]}: {count}" for key, count in sorted(metrics.cloudflare_errors.values.items()))
+    retries = ", ".join(f"{key[0]}: {count}" for key, count in sorted(metrics.cloudflare_retries.values.items()))
+    embed.add_field(name="Cloudflare Errors", value=errors[:1024] or "None", inline=False)
+    embed.add_field(name="Retries", value=retries[:1024] or "None", inline=False)
+    hits = metrics.cache_requests.values.get(("zone", "hit"), 0)
+    misses = metrics.cache_requests.values.get(("zone", "miss"), 0)
+    hit_rate = f"{hits / (hits + misses):.1%}" if hits + misses else "n/a"
+    embed.add_field(name="Zone Cache Hit Rate", value=hit_rate, inline=True)
+    embed.add_field(name="In Flight", value=f"{metrics.cloudflare_in_flight.values.get((), 0)} Cloudflare requests", inline=True)
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the DomainForge bot")
+    parser.add_argument('--shard-count', type=int, help="Total number of shards (default: Discord's recommendation)")
+    parser.add_argument('--shards', help="Shard IDs this process runs, e.g. 0-3 or 0,2,4 (needs --shard-count)")
+    parser.add_argument('--sync', action='store_true', help="Sync the command tree even if it has not changed")
+    parser.add_argument('--workers', type=int, default=1, help="Split --shard-count across this many processes")
+    parser.add_argument('--worker-index', type=int, default=0, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+def parse_shards(text):
+    shard_ids = []
+    for part in text.split(','):
+        start, _, end = part.partition('-')
+        shard_ids.extend(range(int(start), int(end or start) + 1))
+    return shard_ids
+
+def run_workers(args):
+    # Supervisor: start one bot process per contiguous range of shards and wait for them
+    per_worker = -(-args.shard_count // args.workers)
+    processes = []
+    for index in range(args.workers):
+        first, last = index * per_worker, min(args.shard_count, (index + 1) * per_worker) - 1
+        if first > last:
+            break
+        command = [sys.executable, os.path.abspath(__file__), '--shard-count', str(args.shard_count),
+                   '--shards', f"{first}-{last}", '--worker-index', str(index)]
+        if args.sync:
+            command.append('--sync')
+        processes.append(subprocess.Popen(command))
+    try:
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
 
-bot.run(os.getenv('DISCORD_BOT_TOKEN'))
+if __name__ == "__main__":
+    args = parse_args()
+    if (args.workers > 1 or args.shards) and STORAGE_BACKEND != "sqlite":
+        sys.exit('Running several processes needs STORAGE_BACKEND = "sqlite" in config.py so bans, admins, '
+                 'ownership and the Cloudflare rate budget are shared (run `python -m storage.migrate` first).')
+    if args.shards and args.shard_count is None:
+        sys.exit("--shards needs --shard-count")
+    if args.workers > 1:
+        if args.shard_count is None:
+            sys.exit("--workers needs --shard-count")
+        run_workers(args)
+        sys.exit(0)
+    bot.force_sync = args.sync
+    bot.sync_enabled = args.worker_index == 0
+    bot.scan_enabled = args.worker_index == 0
+    bot.shard_count = args.shard_count
+    bot.shard_ids = parse_shards(args.shards) if args.shards else None
+    if args.shards:
+        # Each worker gets its own metrics port, journal file and job queue file
+        if bot.metrics_port is not None:
+            bot.metrics_port += args.worker_index
+        root, ext = os.path.splitext(journal.path)
+        journal.path = f"{root}-{args.worker_index}{ext}"
+        root, ext = os.path.splitext(jobs.path)
+        jobs.path = f"{root}-{args.worker_index}{ext}"
+    bot.run(os.getenv('DISCORD_BOT_TOKEN'))
@@ -0,0 +1,119 @@
+import csv
+import io
+import json
+from config import RECORD_FEATURES, BULK_BATCH_SIZE
+from ratelimit import BULK
+from cloudflare import create_records_batch, delete_subdomain, zones, mirror
+from storage import store
+from validation import validate_record, validate_proxied, validate_ttl, check_available, ValidationError
+
+# Columns written to import result files and exports
+RESULT_COLUMNS = ["row", "name", "type", "status", "record_id", "error"]
+EXPORT_COLUMNS = ["name", "type", "content", "owner", "record_id", "zone"]
+
+def parse_rows(filename, raw):
+    # CSV with a header row, or one JSON object per line
+    text = raw.decode('utf-8-sig')
+    if filename.lower().endswith(('.jsonl', '.json')):
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    return list(csv.DictReader(io.StringIO(text)))
+
+def parse_bool(value):
+    return str(value).strip().lower() in ("1", "true", "yes", "proxied")
+
+def validate_row(row, default_owner):
+    # Returns (zone name, fqdn, owner, Cloudflare payload) or raises ValidationError
+    if not isinstance(row, dict):
+        raise ValidationError("row is not an object")
+    record_type = str(row.get("type", "")).strip().upper()
+    name = str(row.get("name", "")).strip().lower().rstrip('.')
+    zone = str(row.get("zone") or "").strip().lower()
+    zone_name = zone or zones.zone_for(name)
+    if zone_name not in zones.domains:
+        raise ValidationError(f"{name} is not in a configured domain")
+    features = {feature: row.get(feature) for feature in RECORD_FEATURES.get(record_type, [])}
+    fqdn, content, features = validate_record(zone_name, record_type, name, str(row.get("content") or ""), features)
+    check_available(fqdn, record_type, store, mirror)
+    owner = str(row.get("owner") or default_owner).strip()
+    if not owner.isdigit():
+        raise ValidationError(f"owner {owner!r} is not a Discord user ID")
+
+    payload = {"type": record_type, "name": fqdn, "proxied": validate_proxied(record_type, parse_bool(row.get("proxied", False)))}
+    if row.get("ttl"):
+        payload["ttl"] = validate_ttl(str(row["ttl"]))
+    if features:
+        payload["data"] = features
+    else:
+        payload["content"] = content
+    return zone_name, fqdn, owner, payload
+
+async def import_rows(rows, default_owner, progress=None):
+    # Validate every row, then submit the valid ones per zone in batches
+    results = []
+    by_zone = {}
+    seen = set()
+    for number, row in enumerate(rows, start=1):
+        try:
+            zone_name, fqdn, owner, payload = validate_row(row, default_owner)
+            if fqdn in seen:
+                raise ValidationError(f"{fqdn} appears more than once in the file")
+            seen.add(fqdn)
+        except ValidationError as e:
+            fields = row if isinstance(row, dict) else {}
+            results.append({"row": number, "name": fields.get("name", ""), "type": fields.get("type", ""),
+                            "status": "invalid", "record_id": "", "error": str(e)})
+            continue
+        by_zone.setdefault(zone_name, []).append((number, fqdn, owner, payload))
+
+    total = sum(len(entries) for entries in by_zone.values())
+    done = 0
+    for zone_name, entries in by_zone.items():
+        for start in range(0, len(entries), BULK_BATCH_SIZE):
+            chunk = entries[start:start + BULK_BATCH_SIZE]
+            success, outcome = await create_records_batch(zone_name, [payload for _, _, _, payload in chunk])
+            for index, (number, fqdn, owner, payload) in enumerate(chunk):
+                if success and not store.add_subdomain(owner, fqdn, outcome[index]):
+                    # Claimed by someone else while the batch was in flight, drop the record we just made
+                    await delete_subdomain(fqdn, outcome[index], priority=BULK)
+                    results.append({"row": number, "name": fqdn, "type": payload["type"],
+                                    "status": "failed", "record_id": "", "error": f"{fqdn} is already registered"})
+                elif success:
+                    results.append({"row": number, "name": fqdn, "type": payload["type"],
+                                    "status": "created", "record_id": outcome[index]["record_id"], "error": ""})
+                else:
+                    results.append({"row": number, "name": fqdn, "type": payload["type"],
+                                    "status": "failed", "record_id": "", "error": outcome})
+            done += len(chunk)
+            if progress is not None:
+                await progress(done, total)
+    results.sort(key=lambda result: result["row"])
+    return results
+
+def iter_csv(columns, rows):
+    # Yield CSV text one line at a time so large exports are never built in memory as a whole
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+    writer.writeheader()
+    for row in rows:
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(row)
+    yield buffer.getvalue()
+
+def iter_user_records(user_id):
+    for domain in store.get_subdomains(user_id):
+        records = mirror.lookup(domain)
+        if not records:
+            stored = store.get_record(domain) or {}
+            yield {"name": domain, "type": stored.get("type", ""), "content": stored.get("content", ""),
+                   "owner": str(user_id), "record_id": stored.get("record_id", ""), "zone": zones.zone_for(domain)}
+        for record in records:
+            yield dict(record, owner=str(user_id))
+
+def iter_zone_records(zone_name):
+    owners = store.all_subdomains()
+    for record_id, (name, record_type, content, zone) in list(mirror.records.items()):
+        if zone == zone_name:
+            yield {"name": name, "type": record_type, "content": content, "owner": owners.get(name, ""),
+                   "record_id": record_id, "zone": zone}
@@ -1,101 +1,392 @@
 import aiohttp
+import asyncio
 import os
+import time
+import atexit
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from dotenv import load_dotenv
+from config import (CLOUDFLARE_TIMEOUT, CLOUDFLARE_CONNECT_TIMEOUT, CLOUDFLARE_POOL_SIZE,
+                    CLOUDFLARE_KEEPALIVE, CLOUDFLARE_DNS_CACHE_TTL, DOMAINS, ZONE_CACHE_TTL,
+                    CLOUDFLARE_RATE_LIMIT, CLOUDFLARE_RATE_WINDOW, CLOUDFLARE_RATE_BURST, CLOUDFLARE_RATE_CLAIM,
+                    CLOUDFLARE_MAX_RETRIES, CLOUDFLARE_BACKOFF_BASE, CLOUDFLARE_BACKOFF_CAP,
+                    MIRROR_REFRESH_INTERVAL, MIRROR_PAGE_SIZE, STORAGE_BACKEND, DATABASE_FILE,
+                    CLOUDFLARE_PROFILES, DOMAIN_PROFILES)
+from ratelimit import RateLimiter, TokenBucket, SqliteBucket, backoff_delay, INTERACTIVE, BULK
+from mirror import ZoneMirror
+from storage import store
+import metrics
+from journal import journal, error_chain as journal_error_chain
 
 # Load environment variables
 load_dotenv()
 
-# Set up logging
+# Set up logging; records are handed to a listener thread so file writes never block the event loop
 logger = logging.getLogger('cloudflare')
 logger.setLevel(logging.INFO)
 handler = logging.FileHandler(filename='cloudflare.log', encoding='utf-8', mode='a')
 handler.setFormatter(logging.Formatter('%(asctime)s:%(levelname)s:%(name)s: %(message)s'))
-logger.addHandler(handler)
+log_queue = queue.SimpleQueue()
+log_listener = QueueListener(log_queue, handler)
+log_listener.start()
+atexit.register(log_listener.stop)
+logger.addHandler(QueueHandler(log_queue))
 
-API_TOKEN = os.getenv("CLOUDFLARE_API_TOKEN")
-API_BASE_URL = "https://api.cloudflare.com/client/v4"
+API_BASE_URL = os.getenv("CLOUDFLARE_API_BASE_URL", "https://api.cloudflare.com/client/v4")
+# Methods that are safe to resend after a timeout or server error
+IDEMPOTENT_METHODS = {"GET", "PUT", "DELETE"}
+# Error code Cloudflare returns when deleting a record that is already gone
+RECORD_NOT_FOUND_CODE = 81044
+# Error codes Cloudflare returns when a zone ID no longer exists or is not ours
+ZONE_NOT_FOUND_CODES = {1001, 7000, 7003}
 
-async def create_subdomain(domain, record_type, record_content, proxy_status, additional_features):
-    async with aiohttp.ClientSession() as session:
+class CloudflareClient:
+    # Long-lived HTTP client so every API call reuses pooled keep-alive connections
+    def __init__(self, token, base_url=API_BASE_URL, profile="default", rate_limit=CLOUDFLARE_RATE_LIMIT,
+                 rate_window=CLOUDFLARE_RATE_WINDOW, rate_burst=CLOUDFLARE_RATE_BURST, pool_size=CLOUDFLARE_POOL_SIZE):
+        self.token = token
+        self.base_url = base_url
+        self.profile = profile
+        self.pool_size = pool_size
+        self.session = None
+        if STORAGE_BACKEND == "sqlite":
+            # Every process sharing the database also shares the token's budget
+            bucket_name = "cloudflare" if profile == "default" else f"cloudflare:{profile}"
+            bucket = SqliteBucket(DATABASE_FILE, bucket_name, rate_limit, rate_window, rate_burst, CLOUDFLARE_RATE_CLAIM)
+        else:
+            bucket = TokenBucket(rate_limit, rate_window, rate_burst)
+        self.limiter = RateLimiter(bucket)
+
+    async def start(self):
+        if self.session is not None and not self.session.closed:
+            return
+        connector = aiohttp.TCPConnector(limit=self.pool_size,
+                                         keepalive_timeout=CLOUDFLARE_KEEPALIVE,
+                                         ttl_dns_cache=CLOUDFLARE_DNS_CACHE_TTL,
+                                         use_dns_cache=True)
+        timeout = aiohttp.ClientTimeout(total=CLOUDFLARE_TIMEOUT, connect=CLOUDFLARE_CONNECT_TIMEOUT)
         headers = {
-            "Authorization": f"Bearer {API_TOKEN}",
+            "Authorization": f"Bearer {self.token}",
             "Content-Type": "application/json"
         }
-        
+        self.session = aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def request(self, method, path, priority=INTERACTIVE, **kwargs):
+        endpoint = metrics.endpoint_label(path)
+        metrics.cloudflare_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            status, attempts, result = await self._send(method, path, priority, **kwargs)
+        except Exception as e:
+            metrics.cloudflare_errors.inc(code=type(e).__name__)
+            journal.record_call(method, endpoint, None, None, time.perf_counter() - start, journal_error_chain(e))
+            raise
+        finally:
+            metrics.cloudflare_in_flight.dec()
+            metrics.cloudflare_seconds.observe(time.perf_counter() - start, method=method, endpoint=endpoint)
+        errors = []
+        if isinstance(result, dict) and not result.get("success", True):
+            errors = result.get("errors") or []
+            for error in errors:
+                metrics.cloudflare_errors.inc(code=error.get("code"))
+        journal.record_call(method, endpoint, status, attempts, time.perf_counter() - start, errors)
+        return result
+
+    async def _send(self, method, path, priority, **kwargs):
+        # Scripts that never call start() still get a working session
+        if self.session is None or self.session.closed:
+            await self.start()
+        attempt = 0
+        while True:
+            await self.limiter.acquire(priority)
+            try:
+                async with self.session.request(method, f"{self.base_url}{path}", **kwargs) as response:
+                    if response.status == 429 and attempt < CLOUDFLARE_MAX_RETRIES:
+                        # A rate limited request was never applied, so it is safe to resend any method
+                        retry_after = self._retry_after(response, attempt)
+                        logger.warning(f"Rate limited on {method} {path}, retrying in {retry_after:.1f}s")
+                        self.limiter.pause(retry_after)
+                        metrics.cloudflare_retries.inc(reason="429")
+                        attempt += 1
+                        continue
+                    if response.status >= 500 and method in IDEMPOTENT_METHODS and attempt < CLOUDFLARE_MAX_RETRIES:
+                        logger.warning(f"Cloudflare returned {response.status} on {method} {path}, retrying")
+                        metrics.cloudflare_retries.inc(reason="5xx")
+                        attempt += 1
+                        await asyncio.sleep(backoff_delay(attempt, CLOUDFLARE_BACKOFF_BASE, CLOUDFLARE_BACKOFF_CAP))
+                        continue
+                    return response.status, attempt + 1, await response.json(content_type=None)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if method not in IDEMPOTENT_METHODS or attempt >= CLOUDFLARE_MAX_RETRIES:
+                    raise
+                logger.warning(f"{method} {path} failed ({e!r}), retrying")
+                metrics.cloudflare_retries.inc(reason="connection")
+                attempt += 1
+                await asyncio.sleep(backoff_delay(attempt, CLOUDFLARE_BACKOFF_BASE, CLOUDFLARE_BACKOFF_CAP))
+
+    def _retry_after(self, response, attempt):
         try:
-            # Get the zone ID for the domain
-            async with session.get(f"{API_BASE_URL}/zones?name={domain}", headers=headers) as response:
-                zones = await response.json()
-                if not zones["success"]:
-                    logger.error(f"Failed to get zone ID for domain {domain}: {zones['errors']}")
-                    return False, f"Failed to get zone ID for domain {domain}"
-                zone_id = zones["result"][0]["id"]
-            
-            # Create the DNS record
-            subdomain, content = record_content.split(",")
-            data = {
-                "type": record_type,
-                "name": subdomain,
-                "content": content,
-                "proxied": proxy_status
-            }
-            
-            # Add additional features to the data
-            for feature, value in additional_features.items():
-                data[feature] = value
-            
-            async with session.post(f"{API_BASE_URL}/zones/{zone_id}/dns_records", headers=headers, json=data) as response:
-                result = await response.json()
-                if not result["success"]:
-                    logger.error(f"Failed to create DNS record: {result['errors']}")
-                    return False, f"Failed to create DNS record: {result['errors']}"
-                logger.info(f"Successfully created DNS record for {subdomain}")
-                return True, f"Successfully created DNS record for {subdomain}"
+            return float(response.headers["Retry-After"])
+        except (KeyError, ValueError):
+            return backoff_delay(attempt + 1, CLOUDFLARE_BACKOFF_BASE, CLOUDFLARE_BACKOFF_CAP)
+
+class CloudflareClients:
+    # One client per credential profile, each call routed by the zone it touches
+    def __init__(self, profiles, domain_profiles, domains, base_url=API_BASE_URL):
+        self.profiles = {}  # profile name -> CloudflareClient
+        for name, settings in profiles.items():
+            token = os.getenv(settings["token_env"])
+            if not token:
+                logger.warning(f"Cloudflare profile {name}: {settings['token_env']} is not set")
+            self.profiles[name] = CloudflareClient(
+                token, base_url, name,
+                settings.get("rate_limit", CLOUDFLARE_RATE_LIMIT),
+                settings.get("rate_window", CLOUDFLARE_RATE_WINDOW),
+                settings.get("rate_burst", CLOUDFLARE_RATE_BURST),
+                settings.get("pool_size", CLOUDFLARE_POOL_SIZE))
+        self.domain_profiles = {domain: domain_profiles.get(domain, "default") for domain in domains}
+        for domain, name in self.domain_profiles.items():
+            if name not in self.profiles:
+                raise ValueError(f"Domain {domain} uses unknown Cloudflare profile {name}")
+
+    def for_zone(self, zone_name):
+        return self.profiles[self.domain_profiles.get(zone_name, "default")]
+
+    def __iter__(self):
+        return iter(self.profiles.values())
+
+    async def start(self):
+        await asyncio.gather(*(client.start() for client in self))
+
+    async def close(self):
+        await asyncio.gather(*(client.close() for client in self))
+
+class ZoneResolver:
+    # Caches zone name -> zone ID so DNS operations skip the /zones lookup
+    def __init__(self, clients, domains, ttl=ZONE_CACHE_TTL):
+        self.clients = clients
+        self.domains = list(domains)
+        self.ttl = ttl
+        self.zones = {}  # zone name -> (zone ID, expiry timestamp)
+        self._inflight = {}  # zone name -> future of a lookup already running
+        self._refresh_task = None
+
+    async def prefetch(self):
+        # Resolve every configured zone concurrently
+        await asyncio.gather(*(self._lookup(domain, BULK) for domain in self.domains))
+        logger.info(f"Prefetched {len(self.zones)}/{len(self.domains)} zone IDs")
+
+    def start(self):
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+
+    async def _refresh_loop(self):
+        # Refresh well before expiry so requests never wait on a lookup
+        while True:
+            await asyncio.sleep(self.ttl / 2)
+            await asyncio.gather(*(self._lookup(zone_name, BULK) for zone_name in set(self.domains) | set(self.zones)))
+
+    def zone_for(self, name):
+        # Longest configured zone that is a suffix of name, e.g. a.b.example.co.uk -> example.co.uk
+        labels = name.lower().rstrip('.').split('.')
+        known = set(self.domains) | set(self.zones)
+        for i in range(len(labels)):
+            candidate = '.'.join(labels[i:])
+            if candidate in known:
+                return candidate
+        return None
+
+    def invalidate(self, zone_name):
+        self.zones.pop(zone_name, None)
+
+    async def get_zone_id(self, zone_name, priority=INTERACTIVE):
+        cached = self.zones.get(zone_name)
+        if cached and cached[1] > time.monotonic():
+            metrics.cache_requests.inc(cache="zone", result="hit")
+            return cached[0]
+        metrics.cache_requests.inc(cache="zone", result="miss")
+        return await self._lookup(zone_name, priority)
 
+    async def _lookup(self, zone_name, priority=INTERACTIVE):
+        # Concurrent callers for the same zone share a single API request
+        if zone_name in self._inflight:
+            return await asyncio.shield(self._inflight[zone_name])
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[zone_name] = future
+        zone_id = None
+        try:
+            # Only the zone's own account can see it
+            result = await self.clients.for_zone(zone_name).request("GET", "/zones", priority=priority, params={"name": zone_name})
+            if result["success"] and result["result"]:
+                zone_id = result["result"][0]["id"]
+                self.zones[zone_name] = (zone_id, time.monotonic() + self.ttl)
+            elif result["success"]:
+                # The account no longer sees the zone
+                logger.error(f"No zone found for domain {zone_name}")
+                self.invalidate(zone_name)
+            else:
+                # Transient failures keep the cached ID until it expires
+                logger.error(f"Failed to get zone ID for domain {zone_name}: {result['errors']}")
+                self.check_errors(zone_name, result)
         except Exception as e:
-            logger.error(f"An error occurred while creating subdomain: {str(e)}")
-            return False, f"An error occurred: {str(e)}"
+            logger.error(f"An error occurred while looking up zone {zone_name}: {str(e)}")
+        finally:
+            del self._inflight[zone_name]
+            future.set_result(zone_id)
+        return zone_id
 
-async def get_user_subdomains(user_id):
-    # This function is not implemented as we're using local JSON storage
-    # You can implement this if you want to fetch subdomains from Cloudflare directly
-    pass
+    def check_errors(self, zone_name, result):
+        # Drop the cached ID if Cloudflare says the zone is gone
+        codes = {error.get("code") for error in result.get("errors", [])}
+        if codes & ZONE_NOT_FOUND_CODES:
+            logger.warning(f"Zone {zone_name} not found, invalidating cached zone ID")
+            self.invalidate(zone_name)
 
-async def delete_subdomain(domain):
-    async with aiohttp.ClientSession() as session:
-        headers = {
-            "Authorization": f"Bearer {API_TOKEN}",
-            "Content-Type": "application/json"
+# Shared clients, started in the bot's setup hook and closed on shutdown
+clients = CloudflareClients(CLOUDFLARE_PROFILES, DOMAIN_PROFILES, DOMAINS)
+zones = ZoneResolver(clients, DOMAINS)
+mirror = ZoneMirror(clients, zones, MIRROR_REFRESH_INTERVAL, MIRROR_PAGE_SIZE)
+
+async def create_subdomain(domain, record_type, name, content, proxy_status, additional_features):
+    try:
+        # Get the zone ID for the domain
+        zone_id = await zones.get_zone_id(domain)
+        if zone_id is None:
+            return False, f"Failed to get zone ID for domain {domain}", None
+
+        # Create the DNS record
+        data = {
+            "type": record_type,
+            "name": name,
+            "proxied": proxy_status
         }
-        
-        try:
-            # Get the zone ID for the domain
-            zone_name = '.'.join(domain.split('.')[-2:])
-            async with session.get(f"{API_BASE_URL}/zones?name={zone_name}", headers=headers) as response:
-                zones = await response.json()
-                if not zones["success"] or not zones["result"]:
-                    logger.error(f"No zones found for domain {zone_name}")
-                    return False
-                zone_id = zones["result"][0]["id"]
+
+        # Record types with additional features (e.g. SRV) carry them in a data object instead of content
+        if additional_features:
+            data["data"] = dict(additional_features)
+        else:
+            data["content"] = content
+
+        result = await clients.for_zone(domain).request("POST", f"/zones/{zone_id}/dns_records", json=data)
+        if not result["success"]:
+            zones.check_errors(domain, result)
+            logger.error(f"Failed to create DNS record: {result['errors']}")
+            return False, f"Failed to create DNS record: {result['errors']}", None
+        logger.info(f"Successfully created DNS record for {name}")
+        # Keep the IDs so the record can later be deleted with a single call
+        created = result["result"]
+        mirror.note_created(created["id"], created.get("name", name), created.get("type", record_type),
+                            created.get("content") or content, domain)
+        record = {
+            "record_id": created["id"],
+            "zone_id": zone_id,
+            "type": created.get("type", record_type),
+            "content": created.get("content") or content
+        }
+        return True, f"Successfully created DNS record for {name}", record
+
+    except Exception as e:
+        logger.error(f"An error occurred while creating subdomain: {str(e)}")
+        return False, f"An error occurred: {str(e)}", None
+
+async def create_records_batch(zone_name, records, priority=BULK):
+    # Create many records in one call; Cloudflare applies a batch all-or-nothing
+    try:
+        zone_id = await zones.get_zone_id(zone_name, priority)
+        if zone_id is None:
+            return False, f"Failed to get zone ID for domain {zone_name}"
+        result = await clients.for_zone(zone_name).request("POST", f"/zones/{zone_id}/dns_records/batch", priority=priority, json={"posts": records})
+        if not result["success"]:
+            zones.check_errors(zone_name, result)
+            logger.error(f"Failed to create DNS record batch in {zone_name}: {result['errors']}")
+            return False, f"{result['errors']}"
+        created = []
+        for record in result["result"].get("posts", []):
+            mirror.note_created(record["id"], record["name"], record["type"], record["content"], zone_name)
+            created.append({
+                "record_id": record["id"],
+                "zone_id": zone_id,
+                "type": record["type"],
+                "content": record["content"]
+            })
+        logger.info(f"Successfully created {len(created)} DNS records in {zone_name}")
+        return True, created
+    except Exception as e:
+        logger.error(f"An error occurred while creating DNS record batch: {str(e)}")
+        return False, f"An error occurred: {str(e)}"
+
+async def find_record(domain, name, record_type, priority=INTERACTIVE):
+    # Existing record of this type at name, in the shape create_subdomain returns, or None
+    zone_id = await zones.get_zone_id(domain, priority)
+    if zone_id is None:
+        return None
+    result = await clients.for_zone(domain).request("GET", f"/zones/{zone_id}/dns_records", priority=priority,
+                                                    params={"name": name, "type": record_type})
+    if not result["success"]:
+        zones.check_errors(domain, result)
+        logger.error(f"Failed to look up DNS records for {name}: {result['errors']}")
+        return None
+    for found in result["result"]:
+        if found["type"] == record_type:
+            mirror.note_created(found["id"], found["name"], found["type"], found.get("content", ""), domain)
+            return {"record_id": found["id"], "zone_id": zone_id, "type": found["type"], "content": found.get("content", "")}
+    return None
+
+async def get_user_subdomains(user_id):
+    # Registered subdomains of a user with their live records from the local mirror (no API calls)
+    return {domain: mirror.lookup(domain) for domain in store.get_subdomains(user_id)}
+
+async def delete_subdomain(domain, record=None, priority=INTERACTIVE):
+    try:
+        zone_name = zones.zone_for(domain)
+        if record and record.get("record_id") and record.get("zone_id"):
+            zone_id, record_id = record["zone_id"], record["record_id"]
+        else:
+            # Legacy entry without stored IDs, look the record up by name
+            if zone_name is None:
+                logger.error(f"No configured zone matches domain {domain}")
+                return False
+            zone_id = await zones.get_zone_id(zone_name, priority)
+            if zone_id is None:
+                logger.error(f"No zones found for domain {zone_name}")
+                return False
 
             # Get the DNS record ID
-            async with session.get(f"{API_BASE_URL}/zones/{zone_id}/dns_records?name={domain}", headers=headers) as response:
-                records = await response.json()
-                if not records["success"] or not records["result"]:
-                    logger.error(f"No DNS record found for domain {domain}")
-                    return False
-                record_id = records["result"][0]["id"]
-
-            # Delete the DNS record
-            async with session.delete(f"{API_BASE_URL}/zones/{zone_id}/dns_records/{record_id}", headers=headers) as response:
-                result = await response.json()
-                if not result["success"]:
-                    logger.error(f"Failed to delete DNS record for {domain}: {result['errors']}")
-                    return False
-                logger.info(f"Successfully deleted DNS record for {domain}")
-                return True
+            records = await clients.for_zone(zone_name).request("GET", f"/zones/{zone_id}/dns_records", priority=priority, params={"name": domain})
+            if not records["success"] or not records["result"]:
+                zones.check_errors(zone_name, records)
+                logger.error(f"No DNS record found for domain {domain}")
+                return False
+            if len(records["result"]) > 1:
+                logger.warning(f"Found {len(records['result'])} DNS records for legacy entry {domain}, deleting the first")
+            record_id = records["result"][0]["id"]
 
-        except Exception as e:
-            logger.error(f"An error occurred while deleting subdomain: {str(e)}")
+        # Delete the DNS record
+        result = await clients.for_zone(zone_name).request("DELETE", f"/zones/{zone_id}/dns_records/{record_id}", priority=priority)
+        if not result["success"]:
+            if any(error.get("code") == RECORD_NOT_FOUND_CODE for error in result.get("errors", [])):
+                logger.warning(f"DNS record for {domain} was already deleted")
+                mirror.note_deleted(record_id)
+                return True
+            if zone_name:
+                zones.check_errors(zone_name, result)
+            logger.error(f"Failed to delete DNS record for {domain}: {result['errors']}")
             return False
+        logger.info(f"Successfully deleted DNS record for {domain}")
+        mirror.note_deleted(record_id)
+        return True
+
+    except Exception as e:
+        logger.error(f"An error occurred while deleting subdomain: {str(e)}")
+        return False
@@ -7,4 +7,103 @@ RECORD_TYPES = ["A", "AAAA", "CNAME", "TXT"]
 RECORD_FEATURES = {
     "SRV": ["priority", "weight", "port", "target" ],
     # Add more record types and their features as needed
-}
\ No newline at end of file
+}
+
+# How record content is validated for each record type (see validation.py for the schema kinds)
+CONTENT_SCHEMAS = {
+    "A": {"kind": "ipv4"},
+    "AAAA": {"kind": "ipv6"},
+    "CNAME": {"kind": "hostname"},
+    "TXT": {"kind": "text", "max_length": 2048},
+}
+
+# How each additional feature is validated
+FEATURE_SCHEMAS = {
+    "priority": {"kind": "int", "min": 0, "max": 65535},
+    "weight": {"kind": "int", "min": 0, "max": 65535},
+    "port": {"kind": "int", "min": 1, "max": 65535},
+    "target": {"kind": "hostname"},
+}
+
+# Record types Cloudflare can proxy; the others must be DNS only
+PROXIABLE_TYPES = ["A", "AAAA", "CNAME"]
+
+# Subdomain labels users are not allowed to register
+RESERVED_LABELS = ["www", "mail", "smtp", "imap", "pop", "ftp", "ns1", "ns2", "admin", "api", "_dmarc", "_domainkey"]
+
+# Cloudflare HTTP client settings
+CLOUDFLARE_TIMEOUT = 15  # Total seconds allowed for a single API request
+CLOUDFLARE_CONNECT_TIMEOUT = 5  # Seconds allowed to open a new connection
+CLOUDFLARE_POOL_SIZE = 20  # Maximum open connections to the Cloudflare API
+CLOUDFLARE_KEEPALIVE = 60  # Seconds an idle connection is kept open for reuse
+CLOUDFLARE_DNS_CACHE_TTL = 300  # Seconds the resolved API hostname is cached
+ZONE_CACHE_TTL = 3600  # Seconds a resolved zone ID is trusted before it is looked up again
+
+# Storage settings
+DATA_FILE = "data.json"  # Registry of admins, banned users and user subdomains
+SAVE_DELAY = 2  # Seconds to batch changes before data.json is rewritten
+STORAGE_BACKEND = "json"  # "json" for data.json, "sqlite" for DATABASE_FILE (run `python -m storage.migrate` first)
+DATABASE_FILE = "domainforge.db"
+
+# Cloudflare rate limiting (Cloudflare allows 1200 requests per 5 minutes per token)
+CLOUDFLARE_RATE_LIMIT = 1100  # Requests allowed per window, kept below the hard limit for headroom
+CLOUDFLARE_RATE_WINDOW = 300  # Window length in seconds
+CLOUDFLARE_RATE_BURST = 50  # Requests that may be sent back to back before pacing kicks in
+CLOUDFLARE_RATE_CLAIM = 5  # With the SQLite backend, tokens a process takes from the shared budget per database write
+CLOUDFLARE_MAX_RETRIES = 3  # Retries for rate limited, timed out or 5xx requests
+CLOUDFLARE_BACKOFF_BASE = 0.5  # Seconds, doubled on every retry
+CLOUDFLARE_BACKOFF_CAP = 10  # Longest backoff between retries in seconds
+
+# Cloudflare credential profiles. Each profile reads its API token from the named environment variable and
+# gets its own connection pool and rate budget; rate_limit, rate_window, rate_burst and pool_size default
+# to the settings above.
+CLOUDFLARE_PROFILES = {
+    "default": {"token_env": "CLOUDFLARE_API_TOKEN"},
+    # "second": {"token_env": "CLOUDFLARE_API_TOKEN_SECOND", "rate_limit": 1100},
+}
+# Profile used for each domain in DOMAINS; domains not listed here use "default"
+DOMAIN_PROFILES = {
+    # "example.net": "second",
+}
+
+# Local mirror of zone DNS records
+MIRROR_REFRESH_INTERVAL = 900  # Seconds between re-syncs of each zone
+MIRROR_PAGE_SIZE = 1000  # Records fetched per dns_records page
+
+# Bulk import/export
+BULK_BATCH_SIZE = 100  # Records per call to the batch DNS endpoint
+BULK_MAX_ROWS = 5000  # Largest import file accepted
+
+# Metrics
+METRICS_HOST = "127.0.0.1"  # Prometheus endpoint is only reachable locally by default
+METRICS_PORT = 9108  # Set to None to disable the /metrics HTTP endpoint
+
+# Request journal (one JSON line per interaction with the Cloudflare calls it made)
+JOURNAL_FILE = "logs/requests.jsonl"
+JOURNAL_MAX_BYTES = 10 * 1024 * 1024  # Rotate once the file reaches this size
+JOURNAL_BACKUPS = 5  # Rotated files to keep
+JOURNAL_BATCH_SIZE = 200  # Records written per disk write at most
+JOURNAL_FLUSH_INTERVAL = 1.0  # Seconds to wait for more records before writing a batch
+JOURNAL_QUEUE_SIZE = 10000  # Records buffered before new ones are dropped
+
+# Autocomplete
+AUTOCOMPLETE_REBUILD_INTERVAL = 300  # Seconds between full index rebuilds with the SQLite backend (other processes' changes)
+
+# Command tree sync
+COMMAND_HASH_FILE = ".command_hash"  # Hash of the last synced command tree; sync is skipped while it matches
+
+# Background jobs (Cloudflare work done after the interaction is acknowledged)
+JOBS_FILE = "jobs.json"  # Queued jobs, resumed after a restart
+JOBS_SAVE_DELAY = 0.5  # Seconds to batch queue changes before jobs.json is rewritten
+JOB_WORKERS = 8  # Jobs running at once
+JOB_DELETE_CONCURRENCY = 4  # Deletions running at once within one ban
+
+# DNS checks (propagation after create and the registry health scan)
+DNS_RESOLVER = "1.1.1.1"  # Resolver to query, point it at a local stub DNS server for testing
+DNS_RESOLVER_PORT = 53
+DNS_TIMEOUT = 2  # Seconds to wait for an answer before retrying
+DNS_RETRIES = 2  # Retries per query after a timeout
+DNS_CONCURRENCY = 100  # Queries in flight at once
+PROPAGATION_TIMEOUT = 120  # Seconds to wait for a new record to resolve, None to skip the check
+PROPAGATION_INTERVAL = 5  # Seconds between propagation checks
+HEALTH_SCAN_INTERVAL = 6 * 60 * 60  # Seconds between full registry scans, None to only scan on /health
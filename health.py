@@ -0,0 +1,135 @@
+import asyncio
+import ipaddress
+import logging
+import time
+import discord
+from cloudflare import mirror
+from resolver import resolver, NOERROR, NXDOMAIN
+from storage import store
+from config import HEALTH_SCAN_INTERVAL, PROPAGATION_TIMEOUT, PROPAGATION_INTERVAL
+
+logger = logging.getLogger('health')
+
+class HealthScanner:
+    # Periodic DNS audit of every registered subdomain
+    def __init__(self, resolver, interval):
+        self.resolver = resolver
+        self.interval = interval
+        self.report = None  # Last finished scan
+        self._scan_task = None
+        self._loop_task = None
+
+    def start(self):
+        if self._loop_task is None and self.interval:
+            self._loop_task = asyncio.create_task(self._scan_loop())
+
+    def stop(self):
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            self._loop_task = None
+
+    async def _scan_loop(self):
+        while True:
+            # Wait first so the mirror has synced before the first scan
+            await asyncio.sleep(self.interval)
+            report = await self.scan()
+            logger.info(f"Health scan of {report['checked']} subdomains: {len(report['dangling'])} dangling, "
+                        f"{len(report['unresolved'])} unresolved, {len(report['unroutable'])} unroutable, "
+                        f"{len(report['errors'])} errors")
+
+    async def scan(self):
+        # Callers arriving while a scan runs share its result
+        if self._scan_task is None:
+            self._scan_task = asyncio.create_task(self._scan())
+        try:
+            return await asyncio.shield(self._scan_task)
+        finally:
+            if self._scan_task is not None and self._scan_task.done():
+                self._scan_task = None
+
+    def _records(self, name):
+        # Cloudflare's records from the mirror, falling back to what we stored at creation
+        records = mirror.lookup(name)
+        if not records:
+            stored = store.get_record(name)
+            records = [stored] if stored else []
+        return records
+
+    def _checks(self, name):
+        # (query name, qtype, problem) for each record behind a registered subdomain
+        records = self._records(name)
+        if not records:
+            return [(name, "A", "unresolved")]  # Legacy entry, nothing known but the name
+        checks = []
+        for record in records:
+            if record["type"] == "CNAME":
+                # The target disappearing is what makes a subdomain takeover possible
+                checks.append((record["content"], "A", "dangling"))
+            elif record["type"] in ("A", "AAAA", "TXT"):
+                checks.append((name, record["type"], "unresolved"))
+        return checks
+
+    def _unroutable(self, name):
+        targets = []
+        for record in self._records(name):
+            if record["type"] in ("A", "AAAA"):
+                try:
+                    if not ipaddress.ip_address(record["content"]).is_global:
+                        targets.append(f"{name} -> {record['content']}")
+                except ValueError:
+                    targets.append(f"{name} -> {record['content']}")
+        return targets
+
+    async def _scan(self):
+        started = time.monotonic()
+        names = sorted(store.all_subdomains())
+        checks = [(name, check) for name in names for check in self._checks(name)]
+        results = await self.resolver.query_many([(query_name, qtype) for _, (query_name, qtype, _) in checks])
+        report = {"checked": len(names), "dangling": [], "unresolved": [], "unroutable": [], "errors": []}
+        for (name, (query_name, qtype, problem)), result in zip(checks, results):
+            if isinstance(result, Exception):
+                report["errors"].append(f"{query_name} {qtype}: {str(result)}")
+                continue
+            rcode, answers = result
+            if rcode == NXDOMAIN or (rcode == NOERROR and not answers):
+                report[problem].append(f"{name} -> {query_name}" if problem == "dangling" else name)
+            elif rcode != NOERROR:
+                report["errors"].append(f"{query_name} {qtype}: rcode {rcode}")
+        for name in names:
+            report["unroutable"].extend(self._unroutable(name))
+        report["duration"] = time.monotonic() - started
+        report["finished"] = time.time()
+        self.report = report
+        return report
+
+class PropagationWatcher:
+    # Tells the user once a new record answers from the configured resolver
+    def __init__(self, resolver, timeout, interval):
+        self.resolver = resolver
+        self.timeout = timeout
+        self.interval = interval
+        self.tasks = set()
+
+    def watch(self, job, name, record_type, proxied):
+        if not self.timeout:
+            return
+        # Proxied records answer with Cloudflare's addresses instead of the record itself
+        qtype = ("AAAA" if record_type == "AAAA" else "A") if proxied else record_type
+        task = asyncio.create_task(self._watch(job, name, qtype))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _watch(self, job, name, qtype):
+        elapsed = await self.resolver.wait_until_resolves(name, qtype, self.timeout, self.interval)
+        if elapsed is not None:
+            embed = discord.Embed(title="Subdomain Live", description=f"{name} resolves now (after {elapsed:.0f}s).", color=discord.Color.green())
+        else:
+            embed = discord.Embed(title="Still Propagating", description=f"{name} did not resolve within {self.timeout}s. DNS changes can take a few minutes to show up everywhere.", color=discord.Color.yellow())
+        await job.notify(new=True, embed=embed)
+
+    def stop(self):
+        for task in self.tasks:
+            task.cancel()
+
+health = HealthScanner(resolver, HEALTH_SCAN_INTERVAL)
+propagation = PropagationWatcher(resolver, PROPAGATION_TIMEOUT, PROPAGATION_INTERVAL)
@@ -0,0 +1,184 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+import discord
+from config import JOBS_FILE, JOB_WORKERS, JOBS_SAVE_DELAY
+from journal import journal, current_trace
+from storage.json_store import write_json_atomic
+
+logger = logging.getLogger('jobs')
+
+class Job:
+    def __init__(self, kind, key, args, application_id=None, token=None, job_id=None, message_id=None, created=None,
+                 trace_id=None, interaction_id=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.kind = kind
+        self.key = key  # Identical operations share a key and run once
+        self.args = args
+        self.application_id = application_id
+        self.token = token  # Interaction token, valid for follow-ups for 15 minutes
+        self.message_id = message_id
+        self.created = created or time.time()
+        self.trace_id = trace_id  # Journal trace of the interaction that submitted the job
+        self.interaction_id = interaction_id
+        self.interaction = None  # Live interaction, only while this process is handling it
+        self.resumed = False  # Loaded from the file after a restart; it may already have run in part
+        self.message = None
+        self.client = None
+
+    def to_dict(self):
+        return {"id": self.id, "kind": self.kind, "key": self.key, "args": self.args,
+                "application_id": self.application_id, "token": self.token,
+                "message_id": self.message_id, "created": self.created,
+                "trace_id": self.trace_id, "interaction_id": self.interaction_id}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["kind"], data["key"], data["args"], data.get("application_id"), data.get("token"),
+                   data["id"], data.get("message_id"), data.get("created"), data.get("trace_id"),
+                   data.get("interaction_id"))
+
+    async def notify(self, new=False, **kwargs):
+        # Post the first update as a follow-up, then keep editing that message with progress
+        if new:
+            self.message = self.message_id = None
+        try:
+            if self.message is not None:
+                await self.message.edit(**kwargs)
+                return
+            if self.interaction is not None:
+                webhook = self.interaction.followup
+            elif self.token is not None:
+                # Resumed after a restart, rebuild the follow-up webhook from the stored token
+                webhook = discord.Webhook.partial(self.application_id, self.token, client=self.client)
+            else:
+                return
+            if self.message_id is not None:
+                self.message = await webhook.edit_message(self.message_id, **kwargs)
+            else:
+                self.message = await webhook.send(wait=True, **kwargs)
+                self.message_id = self.message.id
+        except discord.HTTPException as e:
+            logger.warning(f"Could not post progress for job {self.kind} {self.key}: {str(e)}")
+
+class JobQueue:
+    # Bounded pool of workers running Cloudflare operations after the interaction was acknowledged
+    def __init__(self, path, workers, save_delay):
+        self.path = path
+        self.workers = workers
+        self.save_delay = save_delay
+        self.handlers = {}  # kind -> async handler(job)
+        self.pending = {}  # job ID -> Job, persisted until finished
+        self.inflight = {}  # key -> future shared by every submitter of that key
+        self.queue = asyncio.Queue()
+        self.client = None
+        self._worker_tasks = []
+        self._dirty = False
+        self._save_task = None
+        self._write_lock = asyncio.Lock()
+
+    def handler(self, kind):
+        def register(func):
+            self.handlers[kind] = func
+            return func
+        return register
+
+    async def start(self, client):
+        self.client = client
+        # Jobs queued before a restart are picked up again
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                for data in json.load(f):
+                    job = Job.from_dict(data)
+                    job.resumed = True
+                    self._enqueue(job)
+            if self.pending:
+                logger.info(f"Resuming {len(self.pending)} queued job(s)")
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self):
+        # Unfinished jobs stay in the file and run again on the next start
+        for task in self._worker_tasks:
+            task.cancel()
+        self._worker_tasks = []
+        if self._save_task is not None:
+            self._save_task.cancel()
+            self._save_task = None
+        await self.flush()
+
+    def submit(self, kind, key, args, interaction=None):
+        # Acknowledge the interaction before submitting so follow-ups never race the initial response.
+        # Returns (future, True) for a new job, or the queued job's (future, False) for a duplicate.
+        if key in self.inflight:
+            return self.inflight[key], False
+        trace = current_trace.get()
+        job = Job(kind, key, args,
+                  getattr(interaction, "application_id", None), getattr(interaction, "token", None),
+                  trace_id=trace["trace_id"] if trace else None, interaction_id=getattr(interaction, "id", None))
+        job.interaction = interaction
+        future = self._enqueue(job)
+        self._mark_dirty()
+        return future, True
+
+    async def wait_for(self, key):
+        future = self.inflight.get(key)
+        return await asyncio.shield(future) if future is not None else None
+
+    def _enqueue(self, job):
+        job.client = self.client
+        future = asyncio.get_running_loop().create_future()
+        self.pending[job.id] = job
+        self.inflight[job.key] = future
+        self.queue.put_nowait(job)
+        return future
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            future = self.inflight.get(job.key)
+            try:
+                with journal.trace(job.interaction, f"job_{job.kind}", job.trace_id) as record:
+                    if job.interaction is None:
+                        record["interaction_id"] = job.interaction_id  # Resumed after a restart
+                    result = await self.handlers[job.kind](job)
+                if future is not None and not future.done():
+                    future.set_result(result)
+            except asyncio.CancelledError:
+                raise  # Shutting down, the job stays persisted and runs again on restart
+            except Exception as e:
+                logger.error(f"Job {job.kind} {job.key} failed: {str(e)}")
+                if future is not None and not future.done():
+                    future.set_exception(e)
+                    future.exception()  # Mark retrieved so unawaited duplicates don't warn
+            self.pending.pop(job.id, None)
+            self.inflight.pop(job.key, None)
+            self._mark_dirty()
+
+    # Persistence
+    def _mark_dirty(self):
+        self._dirty = True
+        if self._save_task is None:
+            self._save_task = asyncio.create_task(self._save_later())
+
+    async def _save_later(self):
+        # Batch every submit and completion during the delay into a single write
+        await asyncio.sleep(self.save_delay)
+        self._save_task = None
+        await self.flush()
+
+    async def flush(self):
+        async with self._write_lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            data = [job.to_dict() for job in self.pending.values()]
+            try:
+                await asyncio.to_thread(write_json_atomic, self.path, data)
+            except Exception as e:
+                self._dirty = True
+                logger.error(f"Failed to save {self.path}: {str(e)}")
+
+jobs = JobQueue(JOBS_FILE, JOB_WORKERS, JOBS_SAVE_DELAY)
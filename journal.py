@@ -0,0 +1,136 @@
+import asyncio
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import time
+import uuid
+from config import (JOURNAL_FILE, JOURNAL_MAX_BYTES, JOURNAL_BACKUPS, JOURNAL_BATCH_SIZE,
+                    JOURNAL_FLUSH_INTERVAL, JOURNAL_QUEUE_SIZE)
+
+logger = logging.getLogger('journal')
+
+# Trace of the interaction currently being handled, inherited by every task it spawns
+current_trace = contextvars.ContextVar('current_trace', default=None)
+
+def error_chain(exc):
+    # Exception plus everything it was raised from, outermost first
+    chain = []
+    while exc is not None and len(chain) < 10:
+        chain.append(f"{type(exc).__name__}: {exc}")
+        exc = exc.__cause__ or exc.__context__
+    return chain
+
+class Journal:
+    # Structured per-interaction log written by a background task in batches
+    def __init__(self, path, max_bytes, backups, batch_size, flush_interval, queue_size):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self._writer_task = None
+
+    def start(self):
+        if self._writer_task is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._writer_task = asyncio.create_task(self._writer())
+
+    async def close(self):
+        if self._writer_task is None:
+            return
+        # The writer drains everything queued before the sentinel, then exits
+        await self.queue.put(None)
+        await self._writer_task
+        self._writer_task = None
+
+    def emit(self, record):
+        # Never block the caller; if the writer falls behind, drop and count
+        try:
+            self.queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    @contextlib.contextmanager
+    def trace(self, interaction, name, trace_id=None):
+        # Collect everything an interaction does into a single journal record; work continued elsewhere
+        # (e.g. a background job) passes the original trace_id so its records link back to the interaction
+        record = {
+            "trace_id": trace_id or uuid.uuid4().hex[:16],
+            "ts": time.time(),
+            "name": name,
+            "interaction_id": getattr(interaction, "id", None),
+            "user_id": getattr(getattr(interaction, "user", None), "id", None),
+            "guild_id": getattr(interaction, "guild_id", None),
+            "status": "ok",
+            "cloudflare": []
+        }
+        token = current_trace.set(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record["status"] = "error"
+            record["error"] = error_chain(e)
+            raise
+        finally:
+            current_trace.reset(token)
+            record["duration_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            self.emit(record)
+
+    def record_call(self, method, endpoint, status, attempts, duration, errors):
+        record = current_trace.get()
+        if record is None:
+            return  # Background work outside an interaction
+        call = {"method": method, "endpoint": endpoint, "status": status, "attempts": attempts,
+                "duration_ms": round(duration * 1000, 2)}
+        if errors:
+            call["errors"] = errors
+            if record["status"] == "ok":
+                record["status"] = "cloudflare_error"
+        record["cloudflare"].append(call)
+
+    async def _writer(self):
+        closing = False
+        while not closing:
+            batch = [await self.queue.get()]
+            # Gather more records for a short while so one write covers many interactions
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1] is not None:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            if batch[-1] is None:
+                closing = True
+                batch.pop()
+            if not batch:
+                continue
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except Exception as e:
+                logger.error(f"Failed to write {len(batch)} journal records: {str(e)}")
+
+    def _write(self, batch):
+        lines = "".join(json.dumps(record, default=str) + "\n" for record in batch)
+        if os.path.exists(self.path) and os.path.getsize(self.path) + len(lines) > self.max_bytes:
+            self._rotate()
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+
+    def _rotate(self):
+        # requests.jsonl -> requests.jsonl.1 -> ... -> requests.jsonl.<backups>
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+journal = Journal(JOURNAL_FILE, JOURNAL_MAX_BYTES, JOURNAL_BACKUPS, JOURNAL_BATCH_SIZE,
+                  JOURNAL_FLUSH_INTERVAL, JOURNAL_QUEUE_SIZE)
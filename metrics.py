@@ -0,0 +1,165 @@
+import functools
+import logging
+import re
+import time
+from aiohttp import web
+from journal import journal
+
+logger = logging.getLogger('metrics')
+
+# Latency buckets in seconds, from a cached lookup up to a slow API call
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+class Metric:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.values = {}  # tuple of label values -> value
+
+    def _key(self, labels):
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def _format_labels(self, key, extra=None):
+        pairs = list(zip(self.labels, key)) + (extra or [])
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{label}="{value}"' for label, value in pairs) + "}"
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        return [f"{self.name}{self._format_labels(key)} {value}" for key, value in self.values.items()]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        entry = self.values.get(key)
+        if entry is None:
+            # Per-bucket counts (not cumulative), then sum and count
+            entry = self.values[key] = [0] * len(self.buckets) + [0, 0.0, 0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[index] += 1
+                break
+        else:
+            entry[len(self.buckets)] += 1
+        entry[-2] += value
+        entry[-1] += 1
+
+    def quantile(self, fraction, **labels):
+        # Estimate from the buckets by linear interpolation, like Prometheus' histogram_quantile
+        entry = self.values.get(self._key(labels))
+        if not entry or not entry[-1]:
+            return None
+        target = fraction * entry[-1]
+        seen = 0
+        lower = 0.0
+        for index, bound in enumerate(self.buckets):
+            count = entry[index]
+            if seen + count >= target and count:
+                return lower + (bound - lower) * (target - seen) / count
+            seen += count
+            lower = bound
+        return self.buckets[-1]
+
+    def count(self, **labels):
+        entry = self.values.get(self._key(labels))
+        return entry[-1] if entry else 0
+
+    def render(self):
+        lines = []
+        for key, entry in self.values.items():
+            cumulative = 0
+            for index, bound in enumerate(self.buckets):
+                cumulative += entry[index]
+                lines.append(f"{self.name}_bucket{self._format_labels(key, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{self._format_labels(key, [('le', '+Inf')])} {entry[-1]}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {entry[-2]}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {entry[-1]}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+command_seconds = registry.register(Histogram("domainforge_command_seconds", "App command latency", ("command",)))
+command_errors = registry.register(Counter("domainforge_command_errors_total", "App commands that raised", ("command",)))
+commands_in_flight = registry.register(Gauge("domainforge_commands_in_flight", "App commands currently running", ("command",)))
+view_step_seconds = registry.register(Histogram("domainforge_view_step_seconds", "Subdomain creation wizard step latency", ("step",)))
+cloudflare_seconds = registry.register(Histogram("domainforge_cloudflare_request_seconds", "Cloudflare API request latency including retries", ("method", "endpoint")))
+cloudflare_errors = registry.register(Counter("domainforge_cloudflare_errors_total", "Cloudflare API errors by error code", ("code",)))
+cloudflare_in_flight = registry.register(Gauge("domainforge_cloudflare_in_flight", "Cloudflare API requests currently running"))
+cloudflare_retries = registry.register(Counter("domainforge_cloudflare_retries_total", "Cloudflare API retries by reason", ("reason",)))
+cache_requests = registry.register(Counter("domainforge_cache_requests_total", "Cache lookups by cache and result", ("cache", "result")))
+
+ID_SEGMENT = re.compile(r'/[0-9a-f]{32}(?=/|$)')
+
+def endpoint_label(path):
+    # /zones/<id>/dns_records/<id> -> /zones/{id}/dns_records/{id} so label cardinality stays bounded
+    return ID_SEGMENT.sub('/{id}', path)
+
+def instrument_command(func):
+    # Wrap an app command callback with latency, error and in-flight tracking, and journal it under a trace ID
+    name = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(interaction, *args, **kwargs):
+        commands_in_flight.inc(command=name)
+        start = time.perf_counter()
+        try:
+            with journal.trace(interaction, name):
+                return await func(interaction, *args, **kwargs)
+        except Exception:
+            command_errors.inc(command=name)
+            raise
+        finally:
+            command_seconds.observe(time.perf_counter() - start, command=name)
+            commands_in_flight.dec(command=name)
+    return wrapper
+
+async def handle_metrics(request):
+    return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+async def start_server(host, port):
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError:
+        await runner.cleanup()
+        raise
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import time
+from ratelimit import BULK
+
+logger = logging.getLogger('cloudflare.mirror')
+
+class ZoneMirror:
+    # Local copy of every record in the configured zones, kept in sync by periodic diffs
+    def __init__(self, clients, zones, interval, page_size):
+        self.clients = clients
+        self.zones = zones
+        self.interval = interval
+        self.page_size = page_size
+        self.records = {}  # record ID -> (name, type, content, zone name)
+        self.by_name = {}  # name -> set of record IDs
+        self.synced = {}  # zone name -> monotonic time of the last successful sync
+        self._touched = []  # One set per running sync, of record IDs we wrote locally while it fetched
+        self._refresh_task = None
+
+    def start(self):
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+
+    async def _refresh_loop(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.interval / 4)
+
+    async def refresh(self, force=False):
+        # Only re-sync zones whose copy is older than the refresh interval
+        now = time.monotonic()
+        due = [zone_name for zone_name in self.zones.domains
+               if force or now - self.synced.get(zone_name, float('-inf')) >= self.interval]
+        await asyncio.gather(*(self.sync_zone(zone_name) for zone_name in due))
+
+    async def sync_zone(self, zone_name):
+        touched = set()
+        self._touched.append(touched)
+        try:
+            zone_id = await self.zones.get_zone_id(zone_name, BULK)
+            if zone_id is None:
+                return
+            fetched = await self._fetch_all(zone_name, zone_id)
+        except Exception as e:
+            logger.error(f"Failed to sync DNS records for zone {zone_name}: {str(e)}")
+            return
+        finally:
+            self._touched.remove(touched)
+        if fetched is None:
+            return
+
+        # Apply only the difference to the index. Records we created or deleted while the pages were
+        # being fetched are newer than the fetched copy, so they are left alone.
+        current = {record_id for record_id, entry in self.records.items() if entry[3] == zone_name}
+        removed = current - fetched.keys() - touched
+        changed = [record_id for record_id, entry in fetched.items()
+                   if record_id not in touched and self.records.get(record_id) != entry]
+        for record_id in removed:
+            self._remove(record_id)
+        for record_id in changed:
+            self._remove(record_id)
+            self._add(record_id, fetched[record_id])
+        self.synced[zone_name] = time.monotonic()
+        if removed or changed:
+            logger.info(f"Mirror of {zone_name}: {len(changed)} added/changed, {len(removed)} removed")
+
+    async def _fetch_all(self, zone_name, zone_id):
+        # Read the first page to learn the page count, then fetch the rest concurrently
+        first = await self._fetch_page(zone_name, zone_id, 1)
+        if not first["success"]:
+            self.zones.check_errors(zone_name, first)
+            logger.error(f"Failed to list DNS records for zone {zone_name}: {first['errors']}")
+            return None
+        pages = [first]
+        total_pages = first.get("result_info", {}).get("total_pages", 1)
+        if total_pages > 1:
+            pages += await asyncio.gather(*(self._fetch_page(zone_name, zone_id, page) for page in range(2, total_pages + 1)))
+        fetched = {}
+        for page in pages:
+            if not page["success"]:
+                logger.error(f"Failed to list DNS records for zone {zone_name}: {page['errors']}")
+                return None
+            for record in page["result"]:
+                fetched[record["id"]] = (record["name"], record["type"], record["content"], zone_name)
+        return fetched
+
+    async def _fetch_page(self, zone_name, zone_id, page):
+        return await self.clients.for_zone(zone_name).request("GET", f"/zones/{zone_id}/dns_records", priority=BULK,
+                                                              params={"page": page, "per_page": self.page_size})
+
+    def _add(self, record_id, entry):
+        self.records[record_id] = entry
+        self.by_name.setdefault(entry[0], set()).add(record_id)
+
+    def _remove(self, record_id):
+        entry = self.records.pop(record_id, None)
+        if entry is None:
+            return
+        ids = self.by_name.get(entry[0])
+        if ids is not None:
+            ids.discard(record_id)
+            if not ids:
+                del self.by_name[entry[0]]
+
+    # Our own writes are applied straight away instead of waiting for the next sync
+    def note_created(self, record_id, name, record_type, content, zone_name):
+        self._note_touched(record_id)
+        self._remove(record_id)
+        self._add(record_id, (name, record_type, content, zone_name))
+
+    def note_deleted(self, record_id):
+        self._note_touched(record_id)
+        self._remove(record_id)
+
+    def _note_touched(self, record_id):
+        for touched in self._touched:
+            touched.add(record_id)
+
+    def is_synced(self, zone_name):
+        return zone_name in self.synced
+
+    def lookup(self, name):
+        return [dict(zip(("record_id", "name", "type", "content", "zone"), (record_id,) + self.records[record_id]))
+                for record_id in self.by_name.get(name, ())]
+
+    def reconcile(self, registered):
+        # Compare the registry (subdomain -> owner) with the mirror using set differences
+        synced_zones = set(self.synced)
+        mirrored = {name for name, ids in self.by_name.items()
+                    if self.records[next(iter(ids))][3] in synced_zones and name not in synced_zones}
+        checked = {name for name in registered if self.zones.zone_for(name) in synced_zones}
+        return {
+            "orphaned": sorted(mirrored - set(registered)),
+            "missing": sorted(checked - mirrored),
+            "duplicates": sorted(name for name in checked & mirrored if len(self.by_name[name]) > 1)
+        }
@@ -0,0 +1,97 @@
+import asyncio
+import bisect
+
+# Discord shows at most 25 autocomplete choices
+MAX_CHOICES = 25
+
+class PrefixIndex:
+    # Sorted list of (lowercased name, name); a prefix search is a bisect plus a short scan.
+    # Matching ignores case but the stored spelling is returned, since the registry is keyed by it.
+    def __init__(self, names=()):
+        self.entries = sorted({(name.lower(), name) for name in names})
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, name):
+        entry = (name.lower(), name)
+        index = bisect.bisect_left(self.entries, entry)
+        if index == len(self.entries) or self.entries[index] != entry:
+            self.entries.insert(index, entry)
+
+    def remove(self, name):
+        entry = (name.lower(), name)
+        index = bisect.bisect_left(self.entries, entry)
+        if index < len(self.entries) and self.entries[index] == entry:
+            del self.entries[index]
+
+    def search(self, prefix, limit=MAX_CHOICES):
+        prefix = prefix.lower()
+        index = bisect.bisect_left(self.entries, (prefix,))
+        results = []
+        while index < len(self.entries) and len(results) < limit and self.entries[index][0].startswith(prefix):
+            results.append(self.entries[index][1])
+            index += 1
+        return results
+
+class SubdomainIndex:
+    # Registry-wide index plus one per user, updated from store events
+    def __init__(self):
+        self.all = PrefixIndex()
+        self.by_user = {}  # user ID -> PrefixIndex
+        self.owners = {}  # subdomain -> user ID
+        self._rebuild_task = None
+
+    def rebuild(self, store):
+        owners = store.all_subdomains()
+        by_user = {}
+        for domain, user_id in owners.items():
+            by_user.setdefault(user_id, []).append(domain)
+        self.all = PrefixIndex(owners)
+        self.by_user = {user_id: PrefixIndex(domains) for user_id, domains in by_user.items()}
+        self.owners = dict(owners)
+
+    def start(self, store, interval):
+        # Only needed when other processes can change the registry behind our back
+        if self._rebuild_task is None:
+            self._rebuild_task = asyncio.create_task(self._rebuild_loop(store, interval))
+
+    def stop(self):
+        if self._rebuild_task is not None:
+            self._rebuild_task.cancel()
+            self._rebuild_task = None
+
+    async def _rebuild_loop(self, store, interval):
+        while True:
+            await asyncio.sleep(interval)
+            self.rebuild(store)
+
+    def on_change(self, event, user_id, domain):
+        if event == "add":
+            previous = self.owners.get(domain)
+            if previous is not None and previous != user_id:
+                self._remove_from_user(previous, domain)
+            self.owners[domain] = user_id
+            self.all.add(domain)
+            self.by_user.setdefault(user_id, PrefixIndex()).add(domain)
+        elif event == "remove" and self.owners.get(domain) == user_id:
+            del self.owners[domain]
+            self.all.remove(domain)
+            self._remove_from_user(user_id, domain)
+
+    def _remove_from_user(self, user_id, domain):
+        index = self.by_user.get(user_id)
+        if index is not None:
+            index.remove(domain)
+            if not index:
+                del self.by_user[user_id]
+
+    def search_user(self, user_id, prefix):
+        index = self.by_user.get(str(user_id))
+        return index.search(prefix.strip().lower()) if index is not None else []
+
+    def search_all(self, prefix):
+        return self.all.search(prefix.strip().lower())
+
+# Shared index used by the /remove and /whois autocompletes
+subdomain_index = SubdomainIndex()
@@ -0,0 +1,149 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import sqlite3
+import time
+
+logger = logging.getLogger('ratelimit')
+
+# Seconds before the limiter tries again when the bucket itself failed (e.g. the database was locked)
+RETRY_DELAY = 0.05
+
+# Request priorities, lower runs first
+INTERACTIVE = 0  # A user is waiting on the result
+BULK = 1  # Admin clean-up and background work
+
+def backoff_delay(attempt, base, cap):
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class TokenBucket:
+    # Process-local bucket; take() returns 0 when a token was granted, otherwise seconds to wait
+    def __init__(self, rate, per, burst):
+        self.capacity = burst
+        self.tokens = burst
+        self.fill_rate = rate / per
+        self.updated = time.monotonic()
+        self.paused_until = 0
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+        self.updated = now
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.fill_rate
+
+    def pause(self, seconds):
+        # Cloudflare told us to back off (Retry-After), stop handing out tokens until then
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+class SqliteBucket:
+    # Same bucket kept in a SQLite row so every process using the database shares one budget.
+    # Tokens are claimed from the row a few at a time so most requests never touch the database.
+    def __init__(self, path, name, rate, per, burst, claim=5):
+        self.name = name
+        self.capacity = burst
+        self.fill_rate = rate / per
+        self.claim = claim
+        self.local = 0  # Tokens already claimed from the row by this process
+        self.db = sqlite3.connect(path, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        # Runs on the event loop, so give up quickly on a locked database and let the limiter retry
+        self.db.execute("PRAGMA busy_timeout=100")
+        self.db.execute("CREATE TABLE IF NOT EXISTS rate_limits (name TEXT PRIMARY KEY, tokens REAL NOT NULL, "
+                        "updated REAL NOT NULL, paused_until REAL NOT NULL DEFAULT 0)")
+        self.db.execute("INSERT OR IGNORE INTO rate_limits (name, tokens, updated) VALUES (?, ?, ?)",
+                        (name, burst, time.time()))
+
+    def _update(self, change):
+        # Read, refill and write the row inside one write transaction
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            tokens, updated, paused_until = self.db.execute(
+                "SELECT tokens, updated, paused_until FROM rate_limits WHERE name = ?", (self.name,)).fetchone()
+            now = time.time()
+            tokens = min(self.capacity, tokens + max(0, now - updated) * self.fill_rate)
+            tokens, paused_until, result = change(now, tokens, paused_until)
+            self.db.execute("UPDATE rate_limits SET tokens = ?, updated = ?, paused_until = ? WHERE name = ?",
+                            (tokens, now, paused_until, self.name))
+            self.db.execute("COMMIT")
+            return result
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def take(self):
+        if self.local >= 1:
+            self.local -= 1
+            return 0
+
+        def change(now, tokens, paused_until):
+            # Result is (seconds to wait, tokens claimed)
+            if now < paused_until:
+                return tokens, paused_until, (paused_until - now, 0)
+            if tokens >= 1:
+                claimed = min(self.claim, int(tokens))
+                return tokens - claimed, paused_until, (0, claimed)
+            return tokens, paused_until, ((1 - tokens) / self.fill_rate, 0)
+        wait, claimed = self._update(change)
+        if claimed:
+            self.local = claimed - 1  # One of them is used right now
+        return wait
+
+    def pause(self, seconds):
+        self.local = 0
+        self._update(lambda now, tokens, paused_until: (0, max(paused_until, now + seconds), None))
+
+class RateLimiter:
+    # Hands out tokens from a bucket to waiters in priority order
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self._waiters = []  # heap of (priority, sequence, future)
+        self._sequence = itertools.count()
+        self._wakeup = None
+
+    async def acquire(self, priority=INTERACTIVE):
+        if not self._waiters and self._take() == 0:
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        if self._wakeup is None:
+            self._wakeup = asyncio.get_running_loop().call_soon(self._dispatch)
+        await future
+
+    def pause(self, seconds):
+        # Called from the request path; a failing bucket must not turn a 429 into an exception
+        try:
+            self.bucket.pause(seconds)
+        except Exception as e:
+            logger.warning(f"Rate limit bucket failed to pause: {str(e)}")
+
+    def _take(self):
+        # Seconds to wait, treating a failing bucket as a short wait instead of an error
+        try:
+            return self.bucket.take()
+        except Exception as e:
+            logger.warning(f"Rate limit bucket failed, retrying: {str(e)}")
+            return RETRY_DELAY
+
+    def _dispatch(self):
+        self._wakeup = None
+        while self._waiters:
+            future = self._waiters[0][2]
+            if future.done():
+                heapq.heappop(self._waiters)  # Waiter was cancelled
+                continue
+            wait = self._take()
+            if wait > 0:
+                self._wakeup = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            future.set_result(None)
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import random
+import socket
+import struct
+import time
+from config import DNS_RESOLVER, DNS_RESOLVER_PORT, DNS_TIMEOUT, DNS_RETRIES, DNS_CONCURRENCY
+
+logger = logging.getLogger('resolver')
+
+QTYPES = {"A": 1, "NS": 2, "CNAME": 5, "MX": 15, "TXT": 16, "AAAA": 28, "SRV": 33}
+TYPE_NAMES = {code: name for name, code in QTYPES.items()}
+
+# Response codes
+NOERROR = 0
+SERVFAIL = 2
+NXDOMAIN = 3
+
+class DnsError(Exception):
+    pass
+
+def encode_name(name):
+    encoded = b""
+    for label in name.rstrip('.').split('.'):
+        raw = label.encode('ascii')
+        encoded += bytes([len(raw)]) + raw
+    return encoded + b"\0"
+
+def build_query(query_id, name, qtype):
+    # Header with recursion desired and one question, then the question itself (class IN)
+    header = struct.pack("!HHHHHH", query_id, 0x0100, 1, 0, 0, 0)
+    return header + encode_name(name) + struct.pack("!HH", QTYPES[qtype], 1)
+
+def read_name(data, offset):
+    # Returns (name, offset after the name), following compression pointers
+    labels = []
+    end = None
+    for _ in range(128):
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = offset + 2
+            offset = struct.unpack_from("!H", data, offset)[0] & 0x3FFF
+            continue
+        offset += 1
+        if length == 0:
+            return ".".join(labels), end if end is not None else offset
+        labels.append(data[offset:offset + length].decode('ascii', 'replace'))
+        offset += length
+    raise DnsError("Name compression loop")
+
+def parse_response(data):
+    # Returns (query ID, rcode, [(name, type, value, ttl)]) from the answer section
+    query_id, flags, qdcount, ancount, _, _ = struct.unpack_from("!HHHHHH", data)
+    offset = 12
+    for _ in range(qdcount):
+        _, offset = read_name(data, offset)
+        offset += 4
+    answers = []
+    for _ in range(ancount):
+        name, offset = read_name(data, offset)
+        rtype, _, ttl, rdlength = struct.unpack_from("!HHIH", data, offset)
+        start, offset = offset + 10, offset + 10 + rdlength
+        if rtype == QTYPES["A"]:
+            value = socket.inet_ntop(socket.AF_INET, data[start:offset])
+        elif rtype == QTYPES["AAAA"]:
+            value = socket.inet_ntop(socket.AF_INET6, data[start:offset])
+        elif rtype in (QTYPES["CNAME"], QTYPES["NS"]):
+            value = read_name(data, start)[0]
+        elif rtype == QTYPES["TXT"]:
+            parts, position = [], start
+            while position < offset:
+                length = data[position]
+                parts.append(data[position + 1:position + 1 + length].decode('utf-8', 'replace'))
+                position += 1 + length
+            value = "".join(parts)
+        else:
+            value = data[start:offset].hex()
+        answers.append((name, TYPE_NAMES.get(rtype, str(rtype)), value, ttl))
+    return query_id, flags & 0xF, answers
+
+class _DnsProtocol(asyncio.DatagramProtocol):
+    def __init__(self, resolver):
+        self.resolver = resolver
+
+    def datagram_received(self, data, addr):
+        self.resolver._received(data)
+
+    def error_received(self, exc):
+        logger.debug(f"DNS socket error: {str(exc)}")
+
+class DnsResolver:
+    # Stub resolver: one UDP socket, many queries in flight matched up by query ID
+    def __init__(self, host, port, timeout, retries, concurrency):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.retries = retries
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.pending = {}  # query ID -> future
+        self._transport = None
+
+    async def start(self):
+        if self._transport is None:
+            self._transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                lambda: _DnsProtocol(self), remote_addr=(self.host, self.port))
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def _received(self, data):
+        try:
+            query_id, rcode, answers = parse_response(data)
+        except (struct.error, IndexError, ValueError, DnsError):
+            return  # Malformed packet
+        future = self.pending.get(query_id)
+        if future is not None and not future.done():
+            future.set_result((rcode, answers))
+
+    async def query(self, name, qtype="A"):
+        # Returns (rcode, answers); raises DnsError when the resolver never answers
+        async with self.semaphore:
+            for _ in range(self.retries + 1):
+                query_id = random.randrange(1 << 16)
+                while query_id in self.pending:
+                    query_id = random.randrange(1 << 16)
+                future = asyncio.get_running_loop().create_future()
+                self.pending[query_id] = future
+                try:
+                    self._transport.sendto(build_query(query_id, name, qtype))
+                    return await asyncio.wait_for(future, self.timeout)
+                except asyncio.TimeoutError:
+                    continue
+                finally:
+                    self.pending.pop(query_id, None)
+        raise DnsError(f"No answer from {self.host}:{self.port} for {name} {qtype}")
+
+    async def query_many(self, queries):
+        # [(name, qtype)] -> [(rcode, answers) or DnsError], all in flight at once under the concurrency cap
+        return await asyncio.gather(*(self.query(name, qtype) for name, qtype in queries), return_exceptions=True)
+
+    async def wait_until_resolves(self, name, qtype, timeout, interval):
+        # Poll until the name has an answer; returns seconds taken, or None on timeout
+        started = time.monotonic()
+        while True:
+            try:
+                rcode, answers = await self.query(name, qtype)
+                if rcode == NOERROR and answers:
+                    return time.monotonic() - started
+            except DnsError:
+                pass
+            if time.monotonic() - started + interval > timeout:
+                return None
+            await asyncio.sleep(interval)
+
+resolver = DnsResolver(DNS_RESOLVER, DNS_RESOLVER_PORT, DNS_TIMEOUT, DNS_RETRIES, DNS_CONCURRENCY)
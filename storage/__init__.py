@@ -0,0 +1,11 @@
+from config import DATA_FILE, SAVE_DELAY, STORAGE_BACKEND, DATABASE_FILE
+from storage.json_store import JsonStore
+from storage.sqlite_store import SqliteStore
+
+def open_store():
+    if STORAGE_BACKEND == "sqlite":
+        return SqliteStore(DATABASE_FILE)
+    return JsonStore(DATA_FILE, save_delay=SAVE_DELAY)
+
+# Shared registry used by the bot, commands and views
+store = open_store()
@@ -0,0 +1,9 @@
+class StoreEvents:
+    # Lets in-memory indexes follow registry changes without re-reading the store
+    def add_listener(self, listener):
+        # listener(event, user_id, domain) with event "add" or "remove"
+        self.listeners.append(listener)
+
+    def _notify(self, event, user_id, domain):
+        for listener in self.listeners:
+            listener(event, str(user_id), domain)
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+from storage.base import StoreEvents
+
+logger = logging.getLogger('storage')
+
+def write_json_atomic(path, data):
+    # Write to a temp file in the same directory, then swap it in so readers never see a partial file
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.json')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+class JsonStore(StoreEvents):
+    # In-memory registry backed by data.json; reads never touch the disk
+    def __init__(self, path, save_delay=2):
+        self.path = path
+        self.save_delay = save_delay
+        self.admins = set()
+        self.banned_users = set()
+        self.users = {}  # user ID -> list of subdomains
+        self.owners = {}  # subdomain -> user ID
+        self.records = {}  # subdomain -> Cloudflare record details (record_id, zone_id, type, content)
+        self.listeners = []
+        self._dirty = False
+        self._save_task = None
+        self._write_lock = asyncio.Lock()
+        self.load()
+
+    def load(self):
+        data = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        self.admins = {str(admin_id) for admin_id in data.get('admins', [])}
+        self.banned_users = {str(user_id) for user_id in data.get('banned_users', [])}
+        self.users = {str(user_id): list(subdomains) for user_id, subdomains in data.get('users', {}).items()}
+        self.owners = {subdomain: user_id for user_id, subdomains in self.users.items() for subdomain in subdomains}
+        self.records = dict(data.get('records', {}))
+
+    def snapshot(self):
+        return {
+            "admins": sorted(self.admins),
+            "users": {user_id: list(subdomains) for user_id, subdomains in self.users.items()},
+            "banned_users": sorted(self.banned_users),
+            "records": dict(self.records)
+        }
+
+    # Reads
+    def is_admin(self, user_id):
+        return str(user_id) in self.admins
+
+    def is_banned(self, user_id):
+        return str(user_id) in self.banned_users
+
+    def get_subdomains(self, user_id):
+        return list(self.users.get(str(user_id), []))
+
+    def owner_of(self, domain):
+        return self.owners.get(domain)
+
+    def all_subdomains(self):
+        # subdomain -> owner user ID for the whole registry
+        return dict(self.owners)
+
+    def get_record(self, domain):
+        # None for legacy entries registered before record IDs were kept
+        record = self.records.get(domain)
+        return dict(record) if record else None
+
+    # Mutations
+    def add_subdomain(self, user_id, domain, record=None):
+        # Claims the name; returns False without touching it when someone already owns it
+        user_id = str(user_id)
+        if domain in self.owners:
+            return False
+        self.users.setdefault(user_id, []).append(domain)
+        self.owners[domain] = user_id
+        if record:
+            self.records[domain] = dict(record)
+        self._mark_dirty()
+        self._notify("add", user_id, domain)
+        return True
+
+    def remove_subdomain(self, user_id, domain):
+        subdomains = self.users.get(str(user_id), [])
+        if domain not in subdomains:
+            return False
+        subdomains.remove(domain)
+        if self.owners.get(domain) == str(user_id):
+            del self.owners[domain]
+            self.records.pop(domain, None)
+        self._mark_dirty()
+        self._notify("remove", user_id, domain)
+        return True
+
+    def ban(self, user_id):
+        if str(user_id) in self.banned_users:
+            return False
+        self.banned_users.add(str(user_id))
+        self._mark_dirty()
+        return True
+
+    def unban(self, user_id):
+        if str(user_id) not in self.banned_users:
+            return False
+        self.banned_users.discard(str(user_id))
+        self._mark_dirty()
+        return True
+
+    def add_admin(self, user_id):
+        self.admins.add(str(user_id))
+        self._mark_dirty()
+
+    # Persistence
+    def _mark_dirty(self):
+        self._dirty = True
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop (e.g. a maintenance script), write straight away
+            self._dirty = False
+            write_json_atomic(self.path, self.snapshot())
+            return
+        if self._save_task is None:
+            self._save_task = asyncio.create_task(self._save_later())
+
+    async def _save_later(self):
+        # Batch every change made during the delay into a single write
+        await asyncio.sleep(self.save_delay)
+        self._save_task = None
+        await self.flush()
+
+    async def flush(self):
+        async with self._write_lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            data = self.snapshot()
+            try:
+                await asyncio.to_thread(write_json_atomic, self.path, data)
+            except Exception as e:
+                self._dirty = True
+                logger.error(f"Failed to save {self.path}: {str(e)}")
+
+    async def close(self):
+        if self._save_task is not None:
+            self._save_task.cancel()
+            self._save_task = None
+        await self.flush()
@@ -0,0 +1,52 @@
+import argparse
+import json
+import os
+from storage.sqlite_store import SqliteStore
+
+# One-shot import of data.json and user_data.json into the SQLite store.
+# Usage: python -m storage.migrate [--data data.json] [--user-data user_data.json] [--db domainforge.db]
+
+def load_json(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def migrate(data_path, user_data_path, db_path):
+    store = SqliteStore(db_path)
+    data = load_json(data_path)
+    user_data = load_json(user_data_path)
+
+    for admin_id in data.get('admins', []):
+        store.add_admin(admin_id)
+    for user_id in data.get('banned_users', []):
+        store.ban(user_id)
+
+    # data.json maps user ID -> [subdomain], user_data.json maps user ID -> {"subdomains": [...], ...}
+    owned = {}
+    for user_id, subdomains in data.get('users', {}).items():
+        owned.setdefault(str(user_id), []).extend(subdomains)
+    for user_id, state in user_data.items():
+        owned.setdefault(str(user_id), []).extend(state.get('subdomains', []))
+
+    records = data.get('records', {})
+    count = 0
+    for user_id, subdomains in owned.items():
+        for domain in dict.fromkeys(subdomains):
+            owner = store.owner_of(domain)
+            if owner is None:
+                store.add_subdomain(user_id, domain, records.get(domain))
+                count += 1
+            elif owner != user_id:
+                print(f"Skipping {domain} for {user_id}: already owned by {owner}")
+    store.db.close()
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate JSON data into the SQLite store")
+    parser.add_argument('--data', default='data.json')
+    parser.add_argument('--user-data', default='user_data.json')
+    parser.add_argument('--db', default='domainforge.db')
+    args = parser.parse_args()
+    count = migrate(args.data, args.user_data, args.db)
+    print(f"Migrated {count} subdomain(s) into {args.db}")
@@ -0,0 +1,113 @@
+import sqlite3
+import time
+from storage.base import StoreEvents
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS subdomains (
+    name TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL REFERENCES users(user_id),
+    record_id TEXT,
+    zone_id TEXT,
+    type TEXT,
+    content TEXT,
+    created_at REAL
+);
+CREATE INDEX IF NOT EXISTS subdomains_user_id ON subdomains(user_id);
+CREATE TABLE IF NOT EXISTS admins (
+    user_id TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS bans (
+    user_id TEXT PRIMARY KEY
+);
+"""
+
+class SqliteStore(StoreEvents):
+    # Same interface as JsonStore, but every lookup is an indexed query instead of a scan
+    def __init__(self, path):
+        self.path = path
+        self.listeners = []
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        # Other bot processes may hold the write lock briefly; every call blocks the event loop
+        # while it waits, so keep the wait short (writes are single small transactions)
+        self.db.execute("PRAGMA busy_timeout=100")
+        self.db.execute("PRAGMA foreign_keys=ON")
+        self.db.executescript(SCHEMA)
+
+    def _exists(self, query, *params):
+        return self.db.execute(query, params).fetchone() is not None
+
+    # Reads
+    def is_admin(self, user_id):
+        return self._exists("SELECT 1 FROM admins WHERE user_id = ?", str(user_id))
+
+    def is_banned(self, user_id):
+        return self._exists("SELECT 1 FROM bans WHERE user_id = ?", str(user_id))
+
+    def get_subdomains(self, user_id):
+        rows = self.db.execute("SELECT name FROM subdomains WHERE user_id = ? ORDER BY rowid", (str(user_id),))
+        return [name for (name,) in rows]
+
+    def owner_of(self, domain):
+        row = self.db.execute("SELECT user_id FROM subdomains WHERE name = ?", (domain,)).fetchone()
+        return row[0] if row else None
+
+    def all_subdomains(self):
+        # subdomain -> owner user ID for the whole registry
+        return dict(self.db.execute("SELECT name, user_id FROM subdomains"))
+
+    def get_record(self, domain):
+        # None for legacy entries registered before record IDs were kept
+        row = self.db.execute("SELECT record_id, zone_id, type, content FROM subdomains "
+                              "WHERE name = ? AND record_id IS NOT NULL", (domain,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("record_id", "zone_id", "type", "content"), row))
+
+    # Mutations
+    def add_subdomain(self, user_id, domain, record=None):
+        # Claims the name; returns False without touching it when someone already owns it
+        record = record or {}
+        try:
+            with self.db:
+                self.db.execute("INSERT OR IGNORE INTO users (user_id) VALUES (?)", (str(user_id),))
+                self.db.execute("INSERT INTO subdomains (name, user_id, record_id, zone_id, type, content, created_at) "
+                                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                (domain, str(user_id), record.get("record_id"), record.get("zone_id"),
+                                 record.get("type"), record.get("content"), time.time()))
+        except sqlite3.IntegrityError:
+            return False
+        self._notify("add", user_id, domain)
+        return True
+
+    def remove_subdomain(self, user_id, domain):
+        with self.db:
+            cursor = self.db.execute("DELETE FROM subdomains WHERE name = ? AND user_id = ?", (domain, str(user_id)))
+        if cursor.rowcount > 0:
+            self._notify("remove", user_id, domain)
+        return cursor.rowcount > 0
+
+    def ban(self, user_id):
+        with self.db:
+            cursor = self.db.execute("INSERT OR IGNORE INTO bans (user_id) VALUES (?)", (str(user_id),))
+        return cursor.rowcount > 0
+
+    def unban(self, user_id):
+        with self.db:
+            cursor = self.db.execute("DELETE FROM bans WHERE user_id = ?", (str(user_id),))
+        return cursor.rowcount > 0
+
+    def add_admin(self, user_id):
+        with self.db:
+            self.db.execute("INSERT OR IGNORE INTO admins (user_id) VALUES (?)", (str(user_id),))
+
+    # Persistence (every mutation is already committed)
+    async def flush(self):
+        pass
+
+    async def close(self):
+        self.db.close()
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# The modules open data.json and cloudflare.log relative to the working directory on import,
+# so run the tests from a scratch directory with the repository on the path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp(prefix="domainforge-tests-"))
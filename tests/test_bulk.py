@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+import bulk
+from storage.json_store import JsonStore
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = JsonStore(str(tmp_path / "data.json"))
+    monkeypatch.setattr(bulk, "store", store)
+    return store
+
+@pytest.fixture
+def cloudflare(monkeypatch):
+    # Records every batch and delete instead of calling the API
+    calls = {"batches": [], "deleted": [], "before_return": None}
+
+    async def create_records_batch(zone_name, records):
+        calls["batches"].append((zone_name, records))
+        if calls["before_return"] is not None:
+            calls["before_return"]()
+        return True, [{"record_id": f"id-{record['name']}", "zone_id": "zone1", "type": record["type"],
+                       "content": record.get("content")} for record in records]
+
+    async def delete_subdomain(domain, record=None, priority=None):
+        calls["deleted"].append((domain, record["record_id"]))
+        return True
+
+    monkeypatch.setattr(bulk, "create_records_batch", create_records_batch)
+    monkeypatch.setattr(bulk, "delete_subdomain", delete_subdomain)
+    return calls
+
+def test_import_rows_rejects_duplicates_in_the_file(store, cloudflare):
+    rows = [{"name": "a.example.org", "type": "A", "content": "192.0.2.1"},
+            {"name": "A.example.org.", "type": "A", "content": "192.0.2.2"}]
+    results = asyncio.run(bulk.import_rows(rows, "1"))
+    assert [result["status"] for result in results] == ["created", "invalid"]
+    assert "more than once" in results[1]["error"]
+    assert len(cloudflare["batches"][0][1]) == 1
+    assert store.owner_of("a.example.org") == "1"
+
+def test_import_rows_reports_non_object_rows(store, cloudflare):
+    rows = [["a.example.org", "A", "192.0.2.1"], "b.example.org", {"name": "c.example.org", "type": "A", "content": "192.0.2.3"}]
+    results = asyncio.run(bulk.import_rows(rows, "1"))
+    assert [(result["row"], result["status"]) for result in results] == [(1, "invalid"), (2, "invalid"), (3, "created")]
+    assert results[0]["error"] == "row is not an object"
+
+def test_import_rows_rejects_bad_ttl(store, cloudflare):
+    rows = [{"name": "a.example.org", "type": "A", "content": "192.0.2.1", "ttl": "30"}]
+    results = asyncio.run(bulk.import_rows(rows, "1"))
+    assert results[0]["status"] == "invalid"
+    assert cloudflare["batches"] == []
+
+def test_import_rows_drops_records_claimed_meanwhile(store, cloudflare):
+    # Someone registers the name while the batch is in flight
+    cloudflare["before_return"] = lambda: store.add_subdomain("2", "a.example.org")
+    rows = [{"name": "a.example.org", "type": "A", "content": "192.0.2.1"}]
+    results = asyncio.run(bulk.import_rows(rows, "1"))
+    assert results[0]["status"] == "failed"
+    assert "already registered" in results[0]["error"]
+    assert cloudflare["deleted"] == [("a.example.org", "id-a.example.org")]
+    assert store.owner_of("a.example.org") == "2"
+    assert store.get_subdomains("1") == []
@@ -0,0 +1,57 @@
+import asyncio
+from mirror import ZoneMirror
+
+ZONE = "example.org"
+
+class StubZones:
+    domains = [ZONE]
+
+    async def get_zone_id(self, zone_name, priority=None):
+        return "zone1"
+
+    def check_errors(self, zone_name, result):
+        pass
+
+class SlowMirror(ZoneMirror):
+    # Serves one page of records, holding it back until released
+    def __init__(self, records):
+        super().__init__(None, StubZones(), 60, 100)
+        self.page = [{"id": record_id, "name": name, "type": record_type, "content": content}
+                     for record_id, (name, record_type, content) in records.items()]
+        self.fetching = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def _fetch_page(self, zone_name, zone_id, page):
+        self.fetching.set()
+        await self.release.wait()
+        return {"success": True, "result": self.page, "result_info": {"total_pages": 1}}
+
+def test_sync_applies_difference():
+    async def run():
+        mirror = SlowMirror({"r1": ("a.example.org", "A", "192.0.2.1")})
+        mirror._add("stale", ("old.example.org", "A", "192.0.2.9", ZONE))
+        mirror.release.set()
+        await mirror.sync_zone(ZONE)
+        return mirror
+
+    mirror = asyncio.run(run())
+    assert set(mirror.records) == {"r1"}
+    assert [record["name"] for record in mirror.lookup("a.example.org")] == ["a.example.org"]
+    assert mirror.lookup("old.example.org") == []
+
+def test_sync_keeps_writes_made_while_fetching():
+    async def run():
+        # The fetched page predates both our create of r2 and our delete of r1
+        mirror = SlowMirror({"r1": ("a.example.org", "A", "192.0.2.1")})
+        mirror._add("r1", ("a.example.org", "A", "192.0.2.1", ZONE))
+        sync = asyncio.create_task(mirror.sync_zone(ZONE))
+        await mirror.fetching.wait()
+        mirror.note_created("r2", "b.example.org", "A", "192.0.2.2", ZONE)
+        mirror.note_deleted("r1")
+        mirror.release.set()
+        await sync
+        return mirror
+
+    mirror = asyncio.run(run())
+    assert set(mirror.records) == {"r2"}
+    assert mirror._touched == []
@@ -0,0 +1,37 @@
+from prefix_index import PrefixIndex, SubdomainIndex
+
+def test_search_matches_prefix_in_order():
+    index = PrefixIndex(["b.example.org", "a.example.org", "ab.example.org", "c.example.net"])
+    assert index.search("a") == ["a.example.org", "ab.example.org"]
+    assert index.search("c.") == ["c.example.net"]
+    assert index.search("z") == []
+
+def test_search_ignores_case_and_keeps_stored_spelling():
+    index = PrefixIndex(["Blog.example.org"])
+    assert index.search("BLOG") == ["Blog.example.org"]
+    assert index.search("blog.ex") == ["Blog.example.org"]
+
+def test_search_respects_limit():
+    index = PrefixIndex(f"host{i:02}.example.org" for i in range(40))
+    assert len(index.search("host")) == 25
+    assert index.search("host", limit=3) == ["host00.example.org", "host01.example.org", "host02.example.org"]
+
+def test_add_and_remove_are_idempotent():
+    index = PrefixIndex()
+    index.add("a.example.org")
+    index.add("a.example.org")
+    assert len(index) == 1
+    index.remove("a.example.org")
+    index.remove("a.example.org")
+    assert len(index) == 0
+
+def test_subdomain_index_follows_store_events():
+    index = SubdomainIndex()
+    index.on_change("add", "1", "a.example.org")
+    index.on_change("add", "2", "b.example.org")
+    assert index.search_user(1, "a") == ["a.example.org"]
+    assert index.search_user(2, "a") == []
+    assert index.search_all(" ") == ["a.example.org", "b.example.org"]
+    index.on_change("remove", "1", "a.example.org")
+    assert index.search_all("a") == []
+    assert "1" not in index.by_user
@@ -0,0 +1,45 @@
+import socket
+import struct
+import pytest
+from resolver import build_query, parse_response, encode_name, read_name, QTYPES, NOERROR, NXDOMAIN, DnsError
+
+def answer(qtype, rdata, ttl=300):
+    # Name is a pointer back to the question
+    return struct.pack("!HHHIH", 0xC00C, QTYPES[qtype], 1, ttl, len(rdata)) + rdata
+
+def response(query, rcode, answers):
+    header = struct.pack("!HHHHHH", struct.unpack_from("!H", query)[0], 0x8180 | rcode, 1, len(answers), 0, 0)
+    return header + query[12:] + b"".join(answers)
+
+def test_parse_response_decodes_answers():
+    query = build_query(0x1234, "blog.example.org", "A")
+    data = response(query, NOERROR, [
+        answer("A", socket.inet_pton(socket.AF_INET, "192.0.2.1")),
+        answer("AAAA", socket.inet_pton(socket.AF_INET6, "2001:db8::1"), ttl=60),
+        answer("CNAME", encode_name("target.example.net")),
+        answer("TXT", b"\x05hello\x06 world"),
+    ])
+    query_id, rcode, answers = parse_response(data)
+    assert query_id == 0x1234
+    assert rcode == NOERROR
+    assert answers == [
+        ("blog.example.org", "A", "192.0.2.1", 300),
+        ("blog.example.org", "AAAA", "2001:db8::1", 60),
+        ("blog.example.org", "CNAME", "target.example.net", 300),
+        ("blog.example.org", "TXT", "hello world", 300),
+    ]
+
+def test_parse_response_nxdomain_without_answers():
+    query = build_query(7, "missing.example.org", "A")
+    assert parse_response(response(query, NXDOMAIN, [])) == (7, NXDOMAIN, [])
+
+def test_read_name_rejects_pointer_loop():
+    data = b"\0" * 12 + b"\xC0\x0C"
+    with pytest.raises(DnsError):
+        read_name(data, 12)
+
+def test_parse_response_rejects_truncated_packet():
+    query = build_query(9, "blog.example.org", "A")
+    data = response(query, NOERROR, [answer("A", socket.inet_pton(socket.AF_INET, "192.0.2.1"))])
+    with pytest.raises((struct.error, IndexError, ValueError)):
+        parse_response(data[:-8])
@@ -0,0 +1,51 @@
+import pytest
+from storage.json_store import JsonStore
+from validation import validate_record, validate_ttl, check_available, ValidationError
+
+class StubMirror:
+    def __init__(self, records):
+        self.records = records  # name -> [record]
+
+    def lookup(self, name):
+        return self.records.get(name, [])
+
+def test_validate_record_normalizes_name_and_content():
+    fqdn, content, features = validate_record("example.org", "A", " Blog.Example.org. ", " 192.0.2.1 ", {})
+    assert fqdn == "blog.example.org"
+    assert content == "192.0.2.1"
+    assert features == {}
+
+@pytest.mark.parametrize("record_type, name, content", [
+    ("A", "blog", "not-an-ip"),
+    ("AAAA", "blog", "192.0.2.1"),
+    ("A", "www", "192.0.2.1"),
+    ("A", "-bad", "192.0.2.1"),
+    ("A", "", "192.0.2.1"),
+    ("MX", "blog", "mail.example.com"),
+])
+def test_validate_record_rejects_bad_input(record_type, name, content):
+    with pytest.raises(ValidationError):
+        validate_record("example.org", record_type, name, content, {})
+
+def test_validate_record_requires_features():
+    with pytest.raises(ValidationError, match="required"):
+        validate_record("example.org", "SRV", "_sip._tcp", "", {"priority": "10", "weight": "5", "port": "5060"})
+
+@pytest.mark.parametrize("value, expected", [("1", 1), ("60", 60), ("86400", 86400)])
+def test_validate_ttl_accepts_cloudflare_values(value, expected):
+    assert validate_ttl(value) == expected
+
+@pytest.mark.parametrize("value", ["0", "2", "59", "86401", "soon"])
+def test_validate_ttl_rejects_other_values(value):
+    with pytest.raises(ValidationError):
+        validate_ttl(value)
+
+def test_check_available(tmp_path):
+    store = JsonStore(str(tmp_path / "data.json"))
+    store.add_subdomain(1, "taken.example.org")
+    mirror = StubMirror({"external.example.org": [{"type": "CNAME"}]})
+    check_available("free.example.org", "A", store, mirror)
+    with pytest.raises(ValidationError, match="already registered"):
+        check_available("taken.example.org", "A", store, mirror)
+    with pytest.raises(ValidationError, match="CNAME record"):
+        check_available("external.example.org", "A", store, mirror)
@@ -0,0 +1,110 @@
+import ipaddress
+import re
+from config import RECORD_TYPES, RECORD_FEATURES, CONTENT_SCHEMAS, FEATURE_SCHEMAS, RESERVED_LABELS, PROXIABLE_TYPES
+
+LABEL_PATTERN = re.compile(r'^(?!-)[a-z0-9_-]{1,63}(?<!-)$')
+RESERVED = {label.lower() for label in RESERVED_LABELS}
+
+class ValidationError(ValueError):
+    pass
+
+def validate_hostname(value, what="hostname"):
+    hostname = value.strip().lower().rstrip('.')
+    if not hostname or len(hostname) > 253 or '.' not in hostname:
+        raise ValidationError(f"{what} must be a fully qualified hostname like example.com")
+    for label in hostname.split('.'):
+        if not LABEL_PATTERN.match(label):
+            raise ValidationError(f"{what} contains an invalid label {label!r}")
+    return hostname
+
+def validate_value(schema, value, what):
+    value = value.strip()
+    kind = schema["kind"]
+    if kind == "ipv4":
+        try:
+            return str(ipaddress.IPv4Address(value))
+        except ValueError:
+            raise ValidationError(f"{what} must be a valid IPv4 address") from None
+    if kind == "ipv6":
+        try:
+            return str(ipaddress.IPv6Address(value))
+        except ValueError:
+            raise ValidationError(f"{what} must be a valid IPv6 address") from None
+    if kind == "hostname":
+        return validate_hostname(value, what)
+    if kind == "int":
+        try:
+            number = int(value)
+        except ValueError:
+            raise ValidationError(f"{what} must be a number") from None
+        if not schema.get("min", number) <= number <= schema.get("max", number):
+            raise ValidationError(f"{what} must be between {schema['min']} and {schema['max']}")
+        return number
+    if kind == "text":
+        if not value:
+            raise ValidationError(f"{what} cannot be empty")
+        if len(value) > schema.get("max_length", 2048):
+            raise ValidationError(f"{what} must be at most {schema['max_length']} characters")
+        if not value.isprintable():
+            raise ValidationError(f"{what} contains unprintable characters")
+        return value
+    raise ValidationError(f"Unknown schema kind {kind!r} for {what}")
+
+def validate_name(name, domain):
+    # Accept a label ("blog") or a name already ending in the domain; returns the FQDN
+    name = name.strip().lower().rstrip('.')
+    if name.endswith(f".{domain}"):
+        name = name[:-len(domain) - 1]
+    if not name or name == domain:
+        raise ValidationError("Subdomain name cannot be empty")
+    labels = name.split('.')
+    for label in labels:
+        if not LABEL_PATTERN.match(label):
+            raise ValidationError(f"Subdomain name contains an invalid label {label!r}")
+    if labels[-1] in RESERVED:
+        raise ValidationError(f"{labels[-1]!r} is reserved and cannot be registered")
+    fqdn = f"{name}.{domain}"
+    if len(fqdn) > 253:
+        raise ValidationError("Subdomain name is too long")
+    return fqdn
+
+def validate_record(domain, record_type, name, content, features):
+    # Returns (fqdn, content, features) with every value checked and converted
+    if record_type not in RECORD_TYPES and record_type not in RECORD_FEATURES:
+        raise ValidationError(f"Record type {record_type} is not supported")
+    fqdn = validate_name(name, domain)
+    feature_names = RECORD_FEATURES.get(record_type, [])
+    cleaned = {}
+    for feature in feature_names:
+        value = features.get(feature)
+        if value is None or not str(value).strip():
+            raise ValidationError(f"{feature.capitalize()} is required")
+        cleaned[feature] = validate_value(FEATURE_SCHEMAS.get(feature, {"kind": "text"}), str(value), feature.capitalize())
+    schema = CONTENT_SCHEMAS.get(record_type)
+    if schema is not None:
+        content = validate_value(schema, content or "", "Record content")
+    elif not feature_names:
+        content = validate_value({"kind": "text"}, content or "", "Record content")
+    return fqdn, content, cleaned
+
+def validate_proxied(record_type, proxied):
+    if proxied and record_type not in PROXIABLE_TYPES:
+        raise ValidationError(f"{record_type} records cannot be proxied")
+    return proxied
+
+def validate_ttl(value):
+    # Cloudflare takes 1 (automatic) or 60..86400 seconds
+    ttl = validate_value({"kind": "int"}, value, "ttl")
+    if ttl != 1 and not 60 <= ttl <= 86400:
+        raise ValidationError("ttl must be 1 (automatic) or between 60 and 86400")
+    return ttl
+
+def check_available(fqdn, record_type, store, mirror=None):
+    # Reject names already registered or that would clash with existing records
+    owner = store.owner_of(fqdn)
+    if owner is not None:
+        raise ValidationError(f"{fqdn} is already registered")
+    if mirror is not None:
+        # Any record at an unregistered name belongs to someone outside the registry
+        for record in mirror.lookup(fqdn):
+            raise ValidationError(f"{fqdn} already has a {record['type']} record")
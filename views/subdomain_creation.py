@@ -1,16 +1,23 @@
 import discord
 from discord.ui import Select, View, Button
-from config import DOMAINS, RECORD_TYPES, RECORD_FEATURES
-from cloudflare import create_subdomain
+from config import DOMAINS, RECORD_TYPES, RECORD_FEATURES, PROXIABLE_TYPES
+from cloudflare import create_subdomain, delete_subdomain, find_record, mirror
+from ratelimit import BULK
+from storage import store
+from validation import validate_record, validate_proxied, check_available, ValidationError
+import metrics
+from journal import journal
+from jobs import jobs
+from health import propagation
+import time
 import uuid
-import json
-import os
 
 class SubdomainCreationView(View):
     def __init__(self):
         super().__init__(timeout=60)  # 60 seconds timeout
         self.domain = None
         self.record_type = None
+        self.subdomain = None
         self.record_content = None
         self.proxy_status = None
         self.additional_features = {}
@@ -20,6 +27,15 @@ class SubdomainCreationView(View):
                              custom_id="domain_select"))
 
     async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        start = time.perf_counter()
+        try:
+            with journal.trace(interaction, f"view:{interaction.data.get('custom_id')}"):
+                await self.dispatch_step(interaction)
+        finally:
+            metrics.view_step_seconds.observe(time.perf_counter() - start, step=interaction.data.get("custom_id"))
+        return True
+
+    async def dispatch_step(self, interaction: discord.Interaction):
         if interaction.data["custom_id"] == "domain_select":
             await self.select_domain(interaction)
         elif interaction.data["custom_id"] == "record_type_select":
@@ -30,7 +46,6 @@ class SubdomainCreationView(View):
             await self.confirm(interaction)
         elif interaction.data["custom_id"] == "cancel":
             await self.cancel(interaction)
-        return True
 
     async def on_timeout(self):
         # Clear the view when it times out
@@ -38,12 +53,15 @@ class SubdomainCreationView(View):
 
     async def select_domain(self, interaction: discord.Interaction):
         self.domain = interaction.data["values"][0]
+        self.show_record_types()
+        embed = discord.Embed(title="Subdomain Creation", description=f"Selected domain: {self.domain}\nNow, choose a record type:", color=discord.Color.blue())
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    def show_record_types(self):
         self.clear_items()
         self.add_item(Select(placeholder="Select a record type", 
                              options=[discord.SelectOption(label=record_type) for record_type in RECORD_TYPES],
                              custom_id="record_type_select"))
-        embed = discord.Embed(title="Subdomain Creation", description=f"Selected domain: {self.domain}\nNow, choose a record type:", color=discord.Color.blue())
-        await interaction.response.edit_message(embed=embed, view=self)
 
     async def select_record_type(self, interaction: discord.Interaction):
         self.record_type = interaction.data["values"][0]
@@ -54,17 +72,20 @@ class SubdomainCreationView(View):
         await self.update_view(interaction)
 
     async def confirm(self, interaction: discord.Interaction):
+        self.stop()
         await self.finalize_subdomain(interaction)
 
     async def cancel(self, interaction: discord.Interaction):
+        self.stop()
         embed = discord.Embed(title="Subdomain Creation", description="Subdomain creation cancelled.", color=discord.Color.red())
         await interaction.response.edit_message(embed=embed, view=None)
 
     async def update_view(self, interaction: discord.Interaction):
         embed = discord.Embed(title="Subdomain Creation", color=discord.Color.green())
         embed.add_field(name="Domain", value=self.domain, inline=False)
+        embed.add_field(name="Subdomain", value=self.subdomain, inline=False)
         embed.add_field(name="Record Type", value=self.record_type, inline=False)
-        embed.add_field(name="Record Content", value=self.record_content, inline=False)
+        embed.add_field(name="Record Content", value=self.record_content or "-", inline=False)
         embed.add_field(name="Proxy Status", value="Proxied" if self.proxy_status else "DNS only", inline=False)
         for feature, value in self.additional_features.items():
             embed.add_field(name=feature.capitalize(), value=value, inline=False)
@@ -76,37 +97,105 @@ class SubdomainCreationView(View):
         await interaction.response.edit_message(embed=embed, view=self)
 
     async def finalize_subdomain(self, interaction: discord.Interaction):
+        # The user may have been banned while this wizard was open
+        if store.is_banned(interaction.user.id):
+            embed = discord.Embed(title="Subdomain Creation Failed", description="You are banned from using this bot.", color=discord.Color.red())
+            await interaction.response.edit_message(embed=embed, view=None)
+            return
+        # Someone may have taken the name while this wizard was open
         try:
-            success, message = await create_subdomain(self.domain, self.record_type, self.record_content, self.proxy_status, self.additional_features)
-            
-            if success:
-                # Save user data
-                data = load_data()
-                user_id = str(interaction.user.id)
-                if user_id not in data['users']:
-                    data['users'][user_id] = []
-                subdomain = f"{self.record_content.split(',')[0]}"
-                data['users'][user_id].append(subdomain)
-                save_data(data)
-
-                embed = discord.Embed(title="Subdomain Created", description=f"Subdomain created successfully!\n{message}", color=discord.Color.green())
-                await interaction.response.edit_message(embed=embed, view=None)
-                
-                # Send DM to user
-                dm_embed = discord.Embed(title="Subdomain Registration Successful", color=discord.Color.green())
-                dm_embed.add_field(name="Domain", value=subdomain, inline=False)
-                dm_embed.add_field(name="Record Type", value=self.record_type, inline=False)
-                dm_embed.add_field(name="Content", value=self.record_content.split(',')[1], inline=False)
-                dm_embed.add_field(name="Proxy Status", value="Proxied" if self.proxy_status else "DNS only", inline=False)
-                for feature, value in self.additional_features.items():
-                    dm_embed.add_field(name=feature.capitalize(), value=value, inline=False)
-                await interaction.user.send(embed=dm_embed)
-            else:
-                embed = discord.Embed(title="Subdomain Creation Failed", description=f"Failed to create DNS record. Cloudflare returned the following error:\n```\n{message}\n```", color=discord.Color.red())
-                await interaction.response.edit_message(embed=embed, view=None)
-        except Exception as e:
-            embed = discord.Embed(title="Error", description=f"An unexpected error occurred: {str(e)}", color=discord.Color.red())
+            validate_proxied(self.record_type, self.proxy_status)
+            check_available(self.subdomain, self.record_type, store, mirror)
+        except ValidationError as e:
+            embed = discord.Embed(title="Subdomain Creation Failed", description=str(e), color=discord.Color.red())
             await interaction.response.edit_message(embed=embed, view=None)
+            return
+
+        # Answer right away, the Cloudflare call runs in the background and reports back in a follow-up
+        embed = discord.Embed(title="Subdomain Creation", description=f"Creating {self.subdomain}...", color=discord.Color.blue())
+        await interaction.response.edit_message(embed=embed, view=None)
+        args = {"user_id": interaction.user.id, "domain": self.domain, "record_type": self.record_type,
+                "subdomain": self.subdomain, "content": self.record_content, "proxy_status": self.proxy_status,
+                "features": self.additional_features}
+        _, queued = jobs.submit("create", f"create:{self.subdomain}", args, interaction)
+        if not queued:
+            embed = discord.Embed(title="Already In Progress", description=f"{self.subdomain} is already being created.", color=discord.Color.yellow())
+            await interaction.followup.send(embed=embed, ephemeral=True)
+
+@jobs.handler("create")
+async def run_create(job):
+    args = job.args
+    try:
+        if store.is_banned(args["user_id"]):
+            embed = discord.Embed(title="Subdomain Creation Failed", description="You are banned from using this bot.", color=discord.Color.red())
+            await job.notify(embed=embed)
+            return False
+        record = None
+        adopted = False
+        if job.resumed:
+            # The previous run may have been stopped after its POST went through; finish that create
+            # instead of posting again, which would fail or leave a duplicate
+            if store.owner_of(args["subdomain"]) == str(args["user_id"]):
+                embed = discord.Embed(title="Subdomain Created", description=f"Subdomain created successfully!\nSuccessfully created DNS record for {args['subdomain']}", color=discord.Color.green())
+                await job.notify(embed=embed)
+                return True
+            if store.owner_of(args["subdomain"]) is None:
+                record = await find_record(args["domain"], args["subdomain"], args["record_type"])
+
+        if record is not None:
+            adopted = True
+            success, message = True, f"Successfully created DNS record for {args['subdomain']}"
+        else:
+            try:
+                check_available(args["subdomain"], args["record_type"], store, mirror)
+            except ValidationError as e:
+                embed = discord.Embed(title="Subdomain Creation Failed", description=str(e), color=discord.Color.red())
+                await job.notify(embed=embed)
+                return False
+
+            success, message, record = await create_subdomain(args["domain"], args["record_type"], args["subdomain"], args["content"], args["proxy_status"], args["features"])
+
+        if success and store.is_banned(args["user_id"]):
+            # Banned while the record was being created; /ban already read the user's list, so undo it here
+            await delete_subdomain(args["subdomain"], record, priority=BULK)
+            embed = discord.Embed(title="Subdomain Creation Failed", description="You are banned from using this bot.", color=discord.Color.red())
+            await job.notify(embed=embed)
+            return False
+
+        if success:
+            # Save user data
+            subdomain = args["subdomain"]
+            if not store.add_subdomain(args["user_id"], subdomain, record):
+                # Another create claimed the name first; drop our record unless it was theirs all along
+                if not adopted:
+                    await delete_subdomain(subdomain, record, priority=BULK)
+                embed = discord.Embed(title="Subdomain Creation Failed", description=f"{subdomain} is already registered.", color=discord.Color.red())
+                await job.notify(embed=embed)
+                return False
+
+            embed = discord.Embed(title="Subdomain Created", description=f"Subdomain created successfully!\n{message}", color=discord.Color.green())
+            await job.notify(embed=embed)
+
+            # Send DM to user
+            dm_embed = discord.Embed(title="Subdomain Registration Successful", color=discord.Color.green())
+            dm_embed.add_field(name="Domain", value=subdomain, inline=False)
+            dm_embed.add_field(name="Record Type", value=args["record_type"], inline=False)
+            dm_embed.add_field(name="Content", value=args["content"] or "-", inline=False)
+            dm_embed.add_field(name="Proxy Status", value="Proxied" if args["proxy_status"] else "DNS only", inline=False)
+            for feature, value in args["features"].items():
+                dm_embed.add_field(name=feature.capitalize(), value=value, inline=False)
+            user = job.interaction.user if job.interaction is not None else await job.client.fetch_user(args["user_id"])
+            await user.send(embed=dm_embed)
+            # Report in another follow-up once the record actually resolves
+            propagation.watch(job, subdomain, args["record_type"], args["proxy_status"])
+        else:
+            embed = discord.Embed(title="Subdomain Creation Failed", description=f"Failed to create DNS record. Cloudflare returned the following error:\n```\n{message}\n```", color=discord.Color.red())
+            await job.notify(embed=embed)
+        return success
+    except Exception as e:
+        embed = discord.Embed(title="Error", description=f"An unexpected error occurred: {str(e)}", color=discord.Color.red())
+        await job.notify(embed=embed)
+        raise
 
 class RecordContentModal(discord.ui.Modal, title="Enter Record Content"):
     def __init__(self, view: SubdomainCreationView):
@@ -121,12 +210,36 @@ class RecordContentModal(discord.ui.Modal, title="Enter Record Content"):
                 self.add_item(discord.ui.TextInput(label=feature.capitalize(), custom_id=feature))
 
     async def on_submit(self, interaction: discord.Interaction):
-        self.view.record_content = f"{self.children[0].value}.{self.view.domain},{self.children[1].value}"
-        
+        start = time.perf_counter()
+        try:
+            with journal.trace(interaction, "view:record_content"):
+                await self.submit(interaction)
+        finally:
+            metrics.view_step_seconds.observe(time.perf_counter() - start, step="record_content")
+
+    async def submit(self, interaction: discord.Interaction):
+        # Reject bad input here instead of spending a Cloudflare round trip on it
+        features = {child.custom_id: child.value for child in self.children[2:]}
+        try:
+            subdomain, content, features = validate_record(self.view.domain, self.view.record_type, self.children[0].value, self.children[1].value, features)
+            check_available(subdomain, self.view.record_type, store, mirror)
+        except ValidationError as e:
+            self.view.show_record_types()
+            embed = discord.Embed(title="Subdomain Creation", description=f"{e}\nChoose a record type to try again:", color=discord.Color.red())
+            await interaction.response.edit_message(embed=embed, view=self.view)
+            return
+
+        self.view.subdomain = subdomain
+        self.view.record_content = content
         # Store additional features
-        for child in self.children[2:]:
-            self.view.additional_features[child.custom_id] = child.value
-        
+        self.view.additional_features = features
+
+        if self.view.record_type not in PROXIABLE_TYPES:
+            # Cloudflare only proxies A, AAAA and CNAME records, skip straight to confirmation
+            self.view.proxy_status = False
+            await self.view.update_view(interaction)
+            return
+
         self.view.clear_items()
         self.view.add_item(Select(placeholder="Proxy status", 
                                   options=[discord.SelectOption(label="Proxied", value="True"),
@@ -135,20 +248,11 @@ class RecordContentModal(discord.ui.Modal, title="Enter Record Content"):
         
         embed = discord.Embed(title="Subdomain Creation", color=discord.Color.blue())
         embed.add_field(name="Domain", value=self.view.domain, inline=False)
+        embed.add_field(name="Subdomain", value=self.view.subdomain, inline=False)
         embed.add_field(name="Record Type", value=self.view.record_type, inline=False)
-        embed.add_field(name="Record Content", value=self.view.record_content, inline=False)
+        embed.add_field(name="Record Content", value=self.view.record_content or "-", inline=False)
         for feature, value in self.view.additional_features.items():
             embed.add_field(name=feature.capitalize(), value=value, inline=False)
         embed.add_field(name="Next Step", value="Choose proxy status", inline=False)
         
         await interaction.response.edit_message(embed=embed, view=self.view)
-
-def load_data():
-    if os.path.exists('data.json'):
-        with open('data.json', 'r') as f:
-            return json.load(f)
-    return {"admins": [], "users": {}}
-
-def save_data(data):
-    with open('data.json', 'w') as f:
-        json.dump(data, f, indent=4)